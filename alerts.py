@@ -0,0 +1,188 @@
+"""Incremental alert rules over each ingested pricing batch.
+
+Rules are evaluated on the new rows only, interval by interval, with every
+zone of an interval handled in one NumPy step. Per-zone EWMA mean and
+variance of each metric (and of its interval-to-interval change) are kept
+in memory, so a cycle costs O(new rows) however long the history is.
+
+Rules come from DEFAULT_RULES or a JSON list of the same fields in the file
+named by NYISO_ALERT_RULES, e.g.
+
+    [{"name": "high_price", "kind": "threshold", "metric": "lbmp",
+      "threshold": 150, "suppress_minutes": 30}]
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from rollups import BUCKET_FORMAT, parse_timestamps
+
+# kind is one of
+#   threshold - the metric is above threshold
+#   zscore    - the metric is more than threshold EWMA deviations from its baseline
+#   ramp      - the change since the zone's previous interval is more than
+#               threshold EWMA deviations from the usual change
+# A rule does not fire again for the same zone within suppress_minutes.
+AlertRule = namedtuple('AlertRule', ['name', 'kind', 'metric', 'threshold', 'suppress_minutes', 'message'],
+                       defaults=[60, None])
+
+KINDS = ('threshold', 'zscore', 'ramp')
+METRICS = ('lbmp', 'load_mw', 'congestion')
+
+DEFAULT_RULES = [
+    AlertRule('high_price', 'threshold', 'lbmp', 100, 60, 'High price in {zone}: ${value:.2f}/MWh'),
+    AlertRule('price_deviation', 'zscore', 'lbmp', 5, 60,
+              'Price in {zone} far from its baseline: ${value:.2f}/MWh ({score:+.1f}σ)'),
+    AlertRule('congestion_spike', 'zscore', 'congestion', 5, 30,
+              'Congestion spike in {zone}: ${value:.2f}/MWh ({score:+.1f}σ)'),
+    AlertRule('load_ramp', 'ramp', 'load_mw', 5, 30, 'Load ramp in {zone}: {value:.0f} MW ({score:+.1f}σ)'),
+]
+
+
+def load_rules(path=None):
+    path = path or os.environ.get('NYISO_ALERT_RULES')
+    if not path:
+        return DEFAULT_RULES
+
+    with open(path) as f:
+        rules = [AlertRule(**rule) for rule in json.load(f)]
+    for rule in rules:
+        if rule.kind not in KINDS:
+            raise ValueError(f"alert rule {rule.name}: kind must be one of {', '.join(KINDS)}")
+        if rule.metric not in METRICS:
+            raise ValueError(f"alert rule {rule.name}: metric must be one of {', '.join(METRICS)}")
+    return rules
+
+
+class AlertEngine:
+    """Rolling per-zone state plus the rules evaluated against it"""
+
+    def __init__(self, rules=None, alpha=0.05, warmup=24):
+        self.rules = rules if rules is not None else load_rules()
+        self.alpha = alpha
+        # Deviation rules stay quiet until a zone has this many samples
+        self.warmup = warmup
+        self.zones = {}
+        shape = (0, len(METRICS))
+        self.count = np.zeros(shape[0])
+        self.last = np.empty(shape)
+        self.mean, self.var = np.empty(shape), np.empty(shape)
+        self.delta_mean, self.delta_var = np.empty(shape), np.empty(shape)
+        self.last_fired = {rule.name: np.empty(0, dtype='datetime64[s]') for rule in self.rules}
+        self.ready = False
+
+    def _zone_index(self, zones):
+        new = [zone for zone in pd.unique(zones) if zone not in self.zones]
+        if new:
+            for zone in new:
+                self.zones[zone] = len(self.zones)
+            grow = len(new)
+            self.count = np.concatenate([self.count, np.zeros(grow)])
+            for name in ('last', 'mean', 'var', 'delta_mean', 'delta_var'):
+                setattr(self, name, np.vstack([getattr(self, name), np.full((grow, len(METRICS)), np.nan)]))
+            for name, fired in self.last_fired.items():
+                self.last_fired[name] = np.concatenate([fired, np.full(grow, np.datetime64('NaT'), 'datetime64[s]')])
+        return np.array([self.zones[zone] for zone in zones], dtype=int)
+
+    def warm_up(self, conn, hours=24):
+        """Seed the rolling state from recent 5-minute rollups and the suppression windows from alerts_log"""
+        latest, = conn.execute('SELECT MAX(bucket) FROM realtime_rollup_5min').fetchone()
+        if latest is not None:
+            since = pd.Timestamp(latest) - pd.Timedelta(hours=hours)
+            recent = pd.DataFrame(conn.execute('''
+                SELECT bucket, zone, load_sum / samples, lbmp_sum / samples, congestion_sum / samples
+                FROM realtime_rollup_5min WHERE bucket > ?
+            ''', (since.strftime(BUCKET_FORMAT),)).fetchall(),
+                columns=['timestamp', 'zone', 'load_mw', 'lbmp', 'congestion'])
+            self.evaluate(recent, fire=False)
+
+        fired = conn.execute('SELECT alert_type, zone, MAX(timestamp) FROM alerts_log GROUP BY alert_type, zone')
+        for name, zone, ts in fired:
+            when = pd.to_datetime(ts, errors='coerce')
+            if name in self.last_fired and zone is not None and not pd.isna(when):
+                self.last_fired[name][self._zone_index([zone])[0]] = np.datetime64(when, 's')
+        self.ready = True
+
+    def evaluate(self, frame, fire=True):
+        """Fold a batch into the rolling state; returns alerts_log rows for the rules that fire"""
+        if frame.empty:
+            return []
+
+        ts = parse_timestamps(frame['timestamp']).to_numpy().astype('datetime64[s]')
+        valid = ~np.isnat(ts)
+        zone_idx = self._zone_index(frame['zone'].to_numpy()[valid])
+        values = frame[list(METRICS)].to_numpy(dtype=float)[valid]
+        ts = ts[valid]
+
+        order = np.argsort(ts, kind='stable')
+        ts, zone_idx, values = ts[order], zone_idx[order], values[order]
+        boundaries = np.flatnonzero(ts[1:] != ts[:-1]) + 1
+
+        alerts = []
+        for rows in np.split(np.arange(len(ts)), boundaries):
+            if fire:
+                alerts += self._fire(ts[rows[0]], zone_idx[rows], values[rows])
+            self._update(zone_idx[rows], values[rows])
+        return alerts
+
+    def _fire(self, when, idx, values):
+        alerts = []
+        warm = self.count[idx] >= self.warmup
+        for rule in self.rules:
+            column = METRICS.index(rule.metric)
+            value = values[:, column]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if rule.kind == 'threshold':
+                    score = value
+                    hit = value > rule.threshold
+                elif rule.kind == 'zscore':
+                    score = (value - self.mean[idx, column]) / self._std(self.var[idx, column])
+                    hit = warm & (np.abs(score) > rule.threshold)
+                else:
+                    delta = value - self.last[idx, column]
+                    score = (delta - self.delta_mean[idx, column]) / self._std(self.delta_var[idx, column])
+                    hit = warm & (np.abs(score) > rule.threshold)
+
+            last_fired = self.last_fired[rule.name][idx]
+            suppressed = (when - last_fired) < np.timedelta64(int(rule.suppress_minutes * 60), 's')
+            hit &= ~(suppressed & ~np.isnat(last_fired))
+            if not hit.any():
+                continue
+
+            self.last_fired[rule.name][idx[hit]] = when
+            zones = list(self.zones)
+            stamp = pd.Timestamp(when).isoformat()
+            message = rule.message or f'{rule.name} in {{zone}}: {{value:.2f}}'
+            for zone, v, s in zip(idx[hit], value[hit], score[hit]):
+                alerts.append((stamp, rule.name, zones[zone], message.format(zone=zones[zone], value=v, score=s), v))
+        return alerts
+
+    def _std(self, var):
+        # A zone with no spread yet has no meaningful deviation
+        return np.sqrt(np.where(var > 0, var, np.nan))
+
+    def _update(self, idx, values):
+        """EWMA mean / variance of each metric and of its change, for one interval of all zones"""
+        a = self.alpha
+        first = (self.count[idx] == 0)[:, None]
+        delta = values - self.last[idx]
+
+        diff = values - self.mean[idx]
+        mean = np.where(first, values, self.mean[idx] + a * diff)
+        var = np.where(first, 0.0, (1 - a) * (self.var[idx] + a * diff * diff))
+
+        has_delta = ~np.isnan(delta)
+        first_delta = has_delta & np.isnan(self.delta_mean[idx])
+        dd = delta - self.delta_mean[idx]
+        delta_mean = np.where(first_delta, delta, np.where(has_delta, self.delta_mean[idx] + a * dd,
+                                                           self.delta_mean[idx]))
+        delta_var = np.where(first_delta, 0.0, np.where(has_delta, (1 - a) * (self.delta_var[idx] + a * dd * dd),
+                                                        self.delta_var[idx]))
+
+        self.mean[idx], self.var[idx] = mean, var
+        self.delta_mean[idx], self.delta_var[idx] = delta_mean, delta_var
+        self.last[idx] = values
+        self.count[idx] += 1
@@ -0,0 +1,203 @@
+"""Cross-zone price spread, correlation and congestion statistics.
+
+For each window (NYISO_ANALYTICS_WINDOWS, default 1h,24h,7d) the engine
+keeps running sums over the intervals inside it: pairwise counts, sums,
+sums of squares and cross products of zone LBMPs, and a fixed-bin histogram
+of each zone's congestion. An interval is added to the sums when ingested
+and subtracted when it slides out of the window, so a batch costs
+O(new intervals x zones²) however long the windows are, and spread means
+and deviations, correlations and congestion percentiles are read straight
+off the sums.
+
+Pairwise sums only count intervals where both zones reported, so a zone
+missing from some intervals does not bias the others.
+"""
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from rollups import EPOCH
+
+WINDOW_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+
+# Congestion histogram: BIN_WIDTH $/MWh bins over CONGESTION_RANGE, the
+# outermost bins also holding anything beyond it
+CONGESTION_RANGE = (-250.0, 750.0)
+BIN_WIDTH = 0.25
+PERCENTILES = (5, 50, 95, 99)
+
+
+def parse_windows(spec=None):
+    """'1h,24h,7d' -> {'1h': 3600, '24h': 86400, '7d': 604800}"""
+    spec = spec or os.environ.get('NYISO_ANALYTICS_WINDOWS', '1h,24h,7d')
+    windows = {}
+    for name in (part.strip() for part in spec.split(',') if part.strip()):
+        if name[-1:] not in WINDOW_UNITS or not name[:-1].isdigit() or int(name[:-1]) <= 0:
+            raise ValueError(f"analytics window {name!r}: expected a count and one of {', '.join(WINDOW_UNITS)}")
+        windows[name] = int(name[:-1]) * WINDOW_UNITS[name[-1]]
+    return windows
+
+
+def _none_for_nan(values):
+    """Nested lists with NaN replaced by None, for JSON"""
+    return np.where(np.isnan(values), None, np.round(values, 4)).tolist()
+
+
+class WindowStats:
+    """Running sums over the intervals of one sliding window"""
+
+    def __init__(self, seconds, bins):
+        self.seconds = seconds
+        self.bins = bins
+        self.intervals = deque()
+        self.size = 0
+        self._resize(0)
+
+    def _resize(self, size):
+        grow = size - self.size
+        pad = ((0, grow), (0, grow))
+        if self.size == 0:
+            self.n, self.sx, self.sxx, self.sxy = (np.zeros((size, size)) for _ in range(4))
+            self.congestion = np.zeros((size, self.bins), dtype=np.int64)
+        else:
+            self.n, self.sx, self.sxx, self.sxy = (np.pad(m, pad) for m in (self.n, self.sx, self.sxx, self.sxy))
+            self.congestion = np.pad(self.congestion, ((0, grow), (0, 0)))
+        self.size = size
+
+    def _apply(self, entry, sign):
+        _, present, price, congestion_bin = entry
+        size = self.size
+        m = np.zeros(size)
+        x = np.zeros(size)
+        m[:len(present)] = present
+        x[:len(price)] = price
+        self.n += sign * np.outer(m, m)
+        # sx[i, j] sums zone i's price over intervals where j also reported
+        self.sx += sign * np.outer(x, m)
+        self.sxx += sign * np.outer(x * x, m)
+        self.sxy += sign * np.outer(x, x)
+        reported = np.flatnonzero(congestion_bin >= 0)
+        self.congestion[reported, congestion_bin[reported]] += sign
+
+    def add(self, entry, size):
+        if size > self.size:
+            self._resize(size)
+        self._apply(entry, 1)
+        self.intervals.append(entry)
+        # Slide: drop intervals at or before ts - seconds
+        while self.intervals and self.intervals[0][0] <= entry[0] - self.seconds:
+            self._apply(self.intervals.popleft(), -1)
+
+    def summary(self, zones):
+        """Spread, correlation and congestion percentiles; O(zones² + zones x bins)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = np.where(self.n > 0, self.n, np.nan)
+            mean_i = self.sx / n           # zone i, over intervals shared with j
+            mean_j = self.sx.T / n
+            var_i = self.sxx / n - mean_i ** 2
+            var_j = self.sxx.T / n - mean_j ** 2
+            cov = self.sxy / n - mean_i * mean_j
+            spread_mean = mean_i - mean_j
+            spread_std = np.sqrt(np.clip(var_i + var_j - 2 * cov, 0, None))
+            correlation = np.clip(cov / np.sqrt(var_i * var_j), -1, 1)
+            # Rounding leaves near-zero variances where a zone's price never moved
+            correlation[(var_i <= 1e-9) | (var_j <= 1e-9)] = np.nan
+
+        congestion = {}
+        counts = self.congestion.sum(axis=1)
+        cumulative = self.congestion.cumsum(axis=1)
+        for zone, i in zones.items():
+            if i >= self.size or counts[i] == 0:
+                continue
+            ranks = np.array(PERCENTILES) / 100 * (counts[i] - 1) + 1
+            bins = np.searchsorted(cumulative[i], ranks)
+            # Midpoint of the bin holding each rank
+            values = CONGESTION_RANGE[0] + (bins + 0.5) * BIN_WIDTH
+            congestion[zone] = dict({f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, values)},
+                                    samples=int(counts[i]))
+
+        names = [zone for zone, i in sorted(zones.items(), key=lambda item: item[1]) if i < self.size]
+        return {
+            'intervals': len(self.intervals),
+            'start': (EPOCH + pd.Timedelta(seconds=int(self.intervals[0][0]))).isoformat() if self.intervals else None,
+            'end': (EPOCH + pd.Timedelta(seconds=int(self.intervals[-1][0]))).isoformat() if self.intervals else None,
+            'zones': names,
+            # Row zone minus column zone, $/MWh
+            'spread_mean': _none_for_nan(spread_mean),
+            'spread_std': _none_for_nan(spread_std),
+            'correlation': _none_for_nan(correlation),
+            'congestion_percentiles': congestion,
+        }
+
+
+class ZoneAnalytics:
+    """Every window's running sums, fed interval by interval from live pricing batches"""
+
+    def __init__(self, windows=None):
+        self.windows = {name: WindowStats(seconds, self._bins())
+                        for name, seconds in (windows or parse_windows()).items()}
+        self.zones = {}
+        self.through_ts = None
+        self.ready = False
+
+    def _bins(self):
+        return int(round((CONGESTION_RANGE[1] - CONGESTION_RANGE[0]) / BIN_WIDTH))
+
+    def warm_up(self, conn):
+        """Fill the windows from the history still in SQLite"""
+        latest, = conn.execute('SELECT MAX(ts) FROM realtime_data').fetchone()
+        if latest is not None:
+            since = latest - max(window.seconds for window in self.windows.values())
+            recent = pd.DataFrame(conn.execute('''
+                SELECT ts, zone, lbmp, congestion FROM realtime_rows WHERE ts > ?
+            ''', (since,)).fetchall(), columns=['ts', 'zone', 'lbmp', 'congestion'])
+            self.ingest(recent)
+        self.ready = True
+
+    def ingest(self, frame):
+        """Fold a batch (ts, zone, lbmp, congestion) into every window; returns the intervals added.
+
+        Intervals at or before the newest one already seen are ignored, so
+        revisions and replays do not count twice.
+        """
+        if self.through_ts is not None:
+            frame = frame[frame['ts'] > self.through_ts]
+        if frame.empty:
+            return 0
+
+        for zone in pd.unique(frame['zone']):
+            if zone not in self.zones:
+                self.zones[zone] = len(self.zones)
+        size = len(self.zones)
+        frame = frame.assign(idx=frame['zone'].map(self.zones)).sort_values('ts', kind='stable')
+
+        ts = frame['ts'].to_numpy(dtype='int64')
+        idx = frame['idx'].to_numpy()
+        price = frame['lbmp'].to_numpy(dtype=float)
+        congestion = frame['congestion'].to_numpy(dtype=float)
+        # -1 marks zones that did not report congestion in an interval
+        binned = np.clip(((congestion - CONGESTION_RANGE[0]) // BIN_WIDTH), 0, self._bins() - 1)
+        binned = np.where(np.isnan(congestion), -1, binned).astype(np.int64)
+
+        boundaries = np.flatnonzero(ts[1:] != ts[:-1]) + 1
+        for rows in np.split(np.arange(len(ts)), boundaries):
+            present = np.zeros(size)
+            values = np.zeros(size)
+            bins = np.full(size, -1, dtype=np.int64)
+            ok = ~np.isnan(price[rows])
+            present[idx[rows][ok]] = 1
+            values[idx[rows][ok]] = price[rows][ok]
+            bins[idx[rows]] = binned[rows]
+            entry = (int(ts[rows[0]]), present, values, bins)
+            for window in self.windows.values():
+                window.add(entry, size)
+
+        self.through_ts = int(ts[-1])
+        return len(boundaries) + 1
+
+    def summaries(self):
+        """Window name -> summary, for the zone_analytics table"""
+        return {name: dict(window.summary(self.zones), window=name, seconds=window.seconds)
+                for name, window in self.windows.items()}
@@ -1,206 +1,185 @@
-from flask import Flask, render_template_string, jsonify
-import sqlite3
-import pandas as pd
-import numpy as np
+"""NYISO dashboard web application.
+
+    gunicorn 'app:create_app()'
+
+create_app() builds one application per worker. Only Flask, sqlite3 and
+the small db/schema/metrics/rollups modules are imported up front:
+pandas, pyarrow and the forecasting stack load with the collector, which a
+worker builds only once it wins the collector lease, or with the archive
+on the first 5-minute history request. Manual refreshes are queued in
+refresh_jobs for the lease holder, so other workers never collect.
+"""
+from flask import Blueprint, Flask, Response, current_app, g, render_template_string, jsonify, request
 from datetime import datetime, timedelta
-import requests
+from collections import deque
+import gzip
+import json
 import threading
 import time
 import os
-from sklearn.ensemble import RandomForestRegressor
 import warnings
+from db import ConnectionManager, lease_for
+from export import EXPORT_DATASETS, EXPORT_FORMATS, export_chunks, export_columns
+from metrics import COLLECTOR_METRICS, REGISTRY, PersistedMetrics
+from refresh import RefreshJobs, RefreshThrottled
+from rollups import BUCKET_FORMAT, choose_rollup, query_history
+from schema import migrate
+from versions import DatasetVersions, watch_versions
 warnings.filterwarnings('ignore')
 
-app = Flask(__name__)
+bp = Blueprint('dashboard', __name__)
 
-class NYISOCollector:
+class ResponseCache:
+    """Pre-serialized response bodies, valid for one collector data version"""
+    
     def __init__(self):
-        self.base_urls = {
-            'realtime_lbmp': 'http://mis.nyiso.com/public/csv/realtime/{date}realtime_zone.csv',
-            'fuel_mix': 'http://mis.nyiso.com/public/csv/rtfuelmix/{date}rtfuelmix.csv'
-        }
-        self.db_connection = sqlite3.connect('nyiso.db', check_same_thread=False)
-        self.setup_database()
-        self.is_collecting = False
-        
-    def setup_database(self):
-        cursor = self.db_connection.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS realtime_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                zone TEXT,
-                load_mw REAL,
-                lbmp REAL,
-                congestion REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fuel_mix_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                fuel_type TEXT,
-                generation_mw REAL,
-                percentage REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alerts_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                alert_type TEXT,
-                zone TEXT,
-                message TEXT,
-                value REAL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        self.db_connection.commit()
+        # Distinguishes ETags minted by different workers and restarts, whose
+        # version counters are unrelated
+        self.token = f'{os.getpid():x}{int(time.time()):x}'
+        self._entries = {}
+        self._lock = threading.Lock()
     
-    def fetch_and_process_data(self):
-        try:
-            today = datetime.now().strftime('%Y%m%d')
-            
-            # Try to fetch real-time pricing data
-            pricing_url = self.base_urls['realtime_lbmp'].format(date=today)
-            try:
-                pricing_response = requests.get(pricing_url, timeout=10)
-                if pricing_response.status_code == 200:
-                    from io import StringIO
-                    pricing_df = pd.read_csv(StringIO(pricing_response.text))
-                    self.process_pricing_data(pricing_df)
-            except:
-                # If real data fails, use sample data
-                self.generate_sample_data()
-                
-            # Generate alerts
-            self.check_alerts()
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error in data collection: {e}")
-            # Generate sample data as fallback
-            self.generate_sample_data()
-            return True
-    
-    def generate_sample_data(self):
-        """Generate sample data for demonstration"""
-        cursor = self.db_connection.cursor()
-        current_time = datetime.now().isoformat()
-        
-        zones = ['CAPITL', 'CENTRL', 'DUNWOD', 'GENESE', 'HUD VL', 'LONGIL', 'MHK VL', 'MILLWD', 'N.Y.C.', 'NORTH', 'WEST']
-        
-        for zone in zones:
-            # Simulate realistic NYISO data
-            if zone == 'N.Y.C.':
-                load = np.random.normal(8000, 800)  # NYC has higher load
-                price = np.random.normal(45, 15)
-            else:
-                load = np.random.normal(2000, 300)
-                price = np.random.normal(35, 10)
-                
-            congestion = max(0, np.random.normal(5, 10))
-            
-            cursor.execute('''
-                INSERT INTO realtime_data 
-                (timestamp, zone, load_mw, lbmp, congestion)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (current_time, zone, load, price, congestion))
-        
-        # Sample fuel mix data
-        fuel_types = [
-            ('Natural Gas', 45.0),
-            ('Nuclear', 25.0),
-            ('Hydro', 15.0),
-            ('Wind', 8.0),
-            ('Solar', 4.0),
-            ('Other', 3.0)
-        ]
-        
-        for fuel, base_pct in fuel_types:
-            # Add some variation
-            percentage = base_pct + np.random.normal(0, 2)
-            generation = percentage * 100  # Simulated MW
-            
-            cursor.execute('''
-                INSERT INTO fuel_mix_data 
-                (timestamp, fuel_type, generation_mw, percentage)
-                VALUES (?, ?, ?, ?)
-            ''', (current_time, fuel, generation, percentage))
-        
-        self.db_connection.commit()
+    def get(self, key, version, build):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != version:
+                    entry = (version, f'{self.token}-{version}', build())
+                    self._entries[key] = entry
+        return entry[1], entry[2]
+
+class EventBroadcaster:
+    """Fans each published server-sent event out to every open stream"""
     
-    def process_pricing_data(self, df):
-        if df.empty:
-            return
-            
-        cursor = self.db_connection.cursor()
-        current_time = datetime.now().isoformat()
-        
-        for _, row in df.iterrows():
-            try:
-                timestamp = row.get('Time Stamp', current_time)
-                zone = row.get('Name', 'Unknown')
-                lbmp = float(row.get('LBMP ($/MWHr)', 0))
-                congestion = float(row.get('Marginal Cost Congestion ($/MWHr)', 0))
-                
-                # Simulate load data
-                load = np.random.normal(8000, 800) if zone == 'N.Y.C.' else np.random.normal(2000, 300)
-                
-                cursor.execute('''
-                    INSERT INTO realtime_data 
-                    (timestamp, zone, load_mw, lbmp, congestion)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (timestamp, zone, load, lbmp, congestion))
-            except:
-                continue
-        
-        self.db_connection.commit()
+    def __init__(self, history=50):
+        self.last_id = 0
+        self._events = deque(maxlen=history)
+        self._condition = threading.Condition()
     
-    def check_alerts(self):
-        cursor = self.db_connection.cursor()
-        current_time = datetime.now().isoformat()
-        
-        # High price alerts
-        cursor.execute('''
-            SELECT zone, lbmp FROM realtime_data 
-            WHERE created_at = (SELECT MAX(created_at) FROM realtime_data)
-            AND lbmp > 100
-        ''')
-        
-        high_price_zones = cursor.fetchall()
-        for zone, lbmp in high_price_zones:
-            cursor.execute('''
-                INSERT INTO alerts_log (timestamp, alert_type, zone, message, value)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (current_time, 'high_price', zone, f'High price in {zone}: ${lbmp:.2f}/MWh', lbmp))
-        
-        self.db_connection.commit()
-
-# Initialize collector
-collector = NYISOCollector()
-
-def background_data_collection():
-    while True:
-        try:
-            collector.fetch_and_process_data()
-            time.sleep(300)  # 5 minutes
-        except Exception as e:
-            print(f"Background collection error: {e}")
-            time.sleep(60)
-
-# Start background thread
-if not collector.is_collecting:
-    collector.is_collecting = True
-    thread = threading.Thread(target=background_data_collection, daemon=True)
-    thread.start()
+    def publish(self, event, data):
+        with self._condition:
+            self.last_id += 1
+            # Serialized once, however many clients are listening
+            payload = f'id: {self.last_id}\nevent: {event}\ndata: {data}\n\n'.encode()
+            self._events.append((self.last_id, payload))
+            self._condition.notify_all()
+    
+    def wait(self, after_id, timeout):
+        """Events newer than after_id, or None if some have already been dropped"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.last_id > after_id, timeout)
+            if self._events and self._events[0][0] > after_id + 1:
+                return None
+            return [payload for event_id, payload in self._events if event_id > after_id]
+
+class DashboardState:
+    """Everything the routes share within one application"""
+    
+    def __init__(self, app, db, collector_mode):
+        self.app = app
+        self.db = db
+        self.collector_mode = collector_mode
+        self.versions = DatasetVersions(db)
+        # Written by whichever process collects, readable here
+        self.stats = PersistedMetrics(COLLECTOR_METRICS)
+        self.response_cache = ResponseCache()
+        self.broadcaster = EventBroadcaster()
+        # Each open stream holds a worker thread, so some are always left for other requests
+        self.stream_slots = threading.BoundedSemaphore(
+            int(os.environ.get('NYISO_STREAM_MAX_CLIENTS', STREAM_MAX_CLIENTS)))
+        # Only queued here; the collector lease holder runs them
+        self.refresh_jobs = RefreshJobs(
+            db, lambda conn: self.stats.value(conn, 'nyiso_collector_last_success_timestamp_seconds'))
+        self._collector = None
+        self._archive = None
+        self._lock = threading.Lock()
+    
+    def collector(self):
+        """This process's NYISOCollector, imported and built on first use"""
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    from collector import NYISOCollector
+                    self._collector = NYISOCollector(self.db, versions=self.versions)
+        return self._collector
+    
+    def archive(self):
+        if self._archive is None:
+            with self._lock:
+                if self._archive is None:
+                    from archive import Archive
+                    self._archive = Archive(self.db)
+        return self._archive
+
+def dashboard_state():
+    return current_app.extensions['nyiso']
+
+def collect_when_elected(state):
+    # Blocks until the current leader exits, so a surviving worker takes over.
+    # Only the leader pays for importing and building the collector.
+    lease = lease_for(state.db)
+    lease.acquire()
+    print(f"Collector lease acquired by pid {os.getpid()}")
+    
+    from collector import collect_forever
+    collect_forever(state.collector())
+
+def create_app(db=None, collector_mode=None, start_threads=True):
+    """Build the dashboard application.
+    
+    collector_mode places collection (default NYISO_COLLECTOR, else 'elect'):
+      elect - every worker competes for a file lease and only the holder collects
+      off   - this process only serves reads; run `python collector.py` separately
+    """
+    app = Flask(__name__)
+    db = db or ConnectionManager()
+    # A PRAGMA read once the schema is current
+    migrate(db)
+    
+    state = DashboardState(app, db, collector_mode or os.environ.get('NYISO_COLLECTOR', 'elect'))
+    app.extensions['nyiso'] = state
+    app.register_blueprint(bp)
+    
+    def publish(changed):
+        publish_delta(state, changed)
+    state.versions.listeners.append(publish)
+    
+    if start_threads:
+        if state.collector_mode == 'elect':
+            threading.Thread(target=collect_when_elected, args=(state,), daemon=True).start()
+        # Picks up commits from whichever process is collecting
+        threading.Thread(target=watch_versions, args=(state.versions,), daemon=True).start()
+    
+    return app
+
+# Collection older than this marks /health as degraded
+STALE_SECONDS = int(os.environ.get('NYISO_STALE_SECONDS', 900))
+
+request_duration = REGISTRY.histogram(
+    'nyiso_http_request_duration_seconds', 'Time to produce each response', ['route', 'method'])
+requests_total = REGISTRY.counter('nyiso_http_requests_total', 'Responses by status', ['route', 'method', 'status'])
+requests_in_flight = REGISTRY.gauge('nyiso_http_requests_in_flight', 'Requests being handled', ['route'])
+
+def route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@bp.before_app_request
+def start_timer():
+    g.started = time.perf_counter()
+    requests_in_flight.inc(route=route_label())
+
+@bp.after_app_request
+def count_response(response):
+    requests_total.inc(route=route_label(), method=request.method, status=response.status_code)
+    return response
+
+@bp.teardown_app_request
+def stop_timer(exc):
+    if 'started' in g:
+        route = route_label()
+        request_duration.observe(time.perf_counter() - g.started, route=route, method=request.method)
+        requests_in_flight.dec(route=route)
 
 # HTML Template
 dashboard_html = '''
@@ -294,10 +273,10 @@ dashboard_html = '''
             priceChart = new Chart(priceCtx, {
                 type: 'line',
                 data: {
-                    labels: ['1h ago', '45m ago', '30m ago', '15m ago', 'Now'],
+                    labels: [],
                     datasets: [{
                         label: 'Average Price ($/MWh)',
-                        data: [32, 35, 38, 36, 34],
+                        data: [],
                         borderColor: '#00d4ff',
                         backgroundColor: 'rgba(0, 212, 255, 0.1)',
                         tension: 0.4
@@ -334,75 +313,81 @@ dashboard_html = '''
             });
         }
 
-        async function updateCurrentData() {
-            try {
-                const response = await fetch('/api/current-data');
-                const data = await response.json();
-                
-                let html = '';
-                data.zones.forEach(zone => {
-                    const priceClass = zone.price > 100 ? 'high' : zone.price > 50 ? 'medium' : 'good';
+        function renderCurrentData(data) {
+            let html = '';
+            data.zones.forEach(zone => {
+                const priceClass = zone.price > 100 ? 'high' : zone.price > 50 ? 'medium' : 'good';
+                html += `
+                    <div class="metric">
+                        <span class="metric-label">${zone.zone}</span>
+                        <span class="metric-value ${priceClass}">$${zone.price.toFixed(2)}/MWh</span>
+                    </div>
+                `;
+            });
+            
+            document.getElementById('current-data').innerHTML = html;
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString();
+        }
+
+        function renderFuelMix(data) {
+            const labels = data.fuel_mix.map(f => f.fuel);
+            const percentages = data.fuel_mix.map(f => f.percentage);
+            
+            fuelChart.data.labels = labels;
+            fuelChart.data.datasets[0].data = percentages;
+            fuelChart.update();
+        }
+
+        function renderAlerts(data) {
+            let html = '';
+            if (data.alerts.length === 0) {
+                html = '<div class="alert info">✅ No alerts - system operating normally</div>';
+            } else {
+                data.alerts.slice(0, 3).forEach(alert => {
+                    const time = new Date(alert.timestamp).toLocaleTimeString();
                     html += `
-                        <div class="metric">
-                            <span class="metric-label">${zone.zone}</span>
-                            <span class="metric-value ${priceClass}">$${zone.price.toFixed(2)}/MWh</span>
+                        <div class="alert">
+                            <strong>${time}</strong> - ${alert.message}
                         </div>
                     `;
                 });
-                
-                document.getElementById('current-data').innerHTML = html;
-                document.getElementById('last-update').textContent = new Date().toLocaleTimeString();
-            } catch (error) {
-                document.getElementById('current-data').innerHTML = '<div class="loading">Error loading data</div>';
             }
+            
+            document.getElementById('alerts-container').innerHTML = html;
         }
 
-        async function updateFuelMix() {
-            try {
-                const response = await fetch('/api/fuel-mix');
-                const data = await response.json();
-                
-                const labels = data.fuel_mix.map(f => f.fuel);
-                const percentages = data.fuel_mix.map(f => f.percentage);
-                
-                fuelChart.data.labels = labels;
-                fuelChart.data.datasets[0].data = percentages;
-                fuelChart.update();
-            } catch (error) {
-                console.error('Error updating fuel mix:', error);
-            }
+        // Snapshot sections are column-oriented; the renderers take rows
+        function rows(columns) {
+            const keys = Object.keys(columns);
+            const count = keys.length ? columns[keys[0]].length : 0;
+            return Array.from({ length: count }, (_, i) =>
+                Object.fromEntries(keys.map(key => [key, columns[key][i]])));
         }
 
-        async function updateAlerts() {
-            try {
-                const response = await fetch('/api/alerts');
-                const data = await response.json();
-                
-                let html = '';
-                if (data.alerts.length === 0) {
-                    html = '<div class="alert info">✅ No alerts - system operating normally</div>';
-                } else {
-                    data.alerts.slice(0, 3).forEach(alert => {
-                        const time = new Date(alert.timestamp).toLocaleTimeString();
-                        html += `
-                            <div class="alert">
-                                <strong>${time}</strong> - ${alert.message}
-                            </div>
-                        `;
-                    });
-                }
-                
-                document.getElementById('alerts-container').innerHTML = html;
-            } catch (error) {
-                document.getElementById('alerts-container').innerHTML = '<div class="alert info">✅ System monitoring active</div>';
-            }
+        function renderPriceHistory(history) {
+            priceChart.data.labels = history.time.map(time => time.slice(11, 16));
+            priceChart.data.datasets[0].data = history.lbmp_avg;
+            priceChart.update();
+        }
+
+        async function fetchSnapshot() {
+            const response = await fetch('/api/snapshot');
+            return response.json();
         }
 
         async function manualUpdate() {
             document.getElementById('status-text').textContent = 'Updating...';
             
             try {
-                await fetch('/api/manual-update');
+                // Joins a refresh already in progress; refused if data is fresh
+                const response = await fetch('/api/refresh', { method: 'POST' });
+                if (response.status === 202) {
+                    let job = await response.json();
+                    for (let i = 0; i < 120 && (job.status === 'queued' || job.status === 'running'); i++) {
+                        await new Promise(resolve => setTimeout(resolve, 1000));
+                        job = await (await fetch(`/api/refresh/${job.id}`)).json();
+                    }
+                }
                 await updateAll();
                 document.getElementById('status-text').textContent = 'System Active';
             } catch (error) {
@@ -411,17 +396,65 @@ dashboard_html = '''
         }
 
         async function updateAll() {
-            await Promise.all([
-                updateCurrentData(),
-                updateFuelMix(),
-                updateAlerts()
-            ]);
+            // Every panel from one request and one consistent read
+            try {
+                const snapshot = await fetchSnapshot();
+                renderCurrentData({ zones: rows(snapshot.zones) });
+                renderFuelMix({ fuel_mix: rows(snapshot.fuel_mix) });
+                renderAlerts({ alerts: rows(snapshot.alerts) });
+                renderPriceHistory(snapshot.price_history);
+            } catch (error) {
+                document.getElementById('current-data').innerHTML = '<div class="loading">Error loading data</div>';
+            }
+        }
+
+        // Polling is only the fallback while the event stream is unavailable
+        let pollTimer = null;
+
+        function startPolling() {
+            if (pollTimer === null) {
+                updateAll();
+                pollTimer = setInterval(updateAll, 30000); // Update every 30 seconds
+            }
+        }
+
+        function stopPolling() {
+            if (pollTimer !== null) {
+                clearInterval(pollTimer);
+                pollTimer = null;
+            }
+        }
+
+        function applyUpdate(event) {
+            const data = JSON.parse(event.data);
+            if (data.current) renderCurrentData(data.current);
+            if (data.price_history) renderPriceHistory(data.price_history);
+            if (data.fuel_mix) renderFuelMix(data.fuel_mix);
+            if (data.alerts) renderAlerts(data.alerts);
+        }
+
+        function connectStream() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            
+            const source = new EventSource('/api/stream');
+            source.addEventListener('snapshot', applyUpdate);
+            source.addEventListener('delta', applyUpdate);
+            source.onopen = stopPolling;
+            source.onerror = () => {
+                // EventSource retries on its own unless the server refused the stream
+                startPolling();
+                if (source.readyState === EventSource.CLOSED) {
+                    setTimeout(connectStream, 60000);
+                }
+            };
         }
 
         document.addEventListener('DOMContentLoaded', () => {
             initCharts();
-            updateAll();
-            setInterval(updateAll, 30000); // Update every 30 seconds
+            connectStream();
         });
     </script>
 </body>
@@ -429,123 +462,484 @@ dashboard_html = '''
 '''
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def dashboard():
     return render_template_string(dashboard_html)
 
-@app.route('/api/current-data')
-def get_current_data():
-    cursor = collector.db_connection.cursor()
+def cached_body(state, key, build):
+    return state.response_cache.get(key, state.versions.data_version,
+                                    lambda: state.app.json.response(build(state.db)).get_data())
+
+def cached_json(key, build):
+    """Serve a read endpoint from the response cache, honouring If-None-Match"""
+    etag, body = cached_body(dashboard_state(), key, build)
     
-    cursor.execute('''
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def current_rows(conn):
+    return conn.execute('''
         SELECT zone, load_mw, lbmp, congestion
-        FROM realtime_data 
-        WHERE created_at = (SELECT MAX(created_at) FROM realtime_data)
+        FROM realtime_latest
         ORDER BY zone
-    ''')
-    
-    current_data = cursor.fetchall()
+    ''').fetchall()
+
+def fuel_mix_rows(conn):
+    # Written largest share first by the collector
+    return conn.execute('''
+        SELECT fuel_type, generation_mw, percentage
+        FROM fuel_mix_latest
+        ORDER BY rowid
+    ''').fetchall()
+
+def alert_rows(conn):
+    return conn.execute('''
+        SELECT timestamp, alert_type, zone, message, value
+        FROM alerts_log 
+        ORDER BY created_at DESC 
+        LIMIT 10
+    ''').fetchall()
+
+def price_history_rows(conn, now):
+    # The price chart: last 24 hours of hourly averages, averaged across zones
+    return conn.execute('''
+        SELECT bucket, AVG(lbmp_sum / samples) FROM realtime_rollup_hourly
+        WHERE bucket >= ? AND bucket < ?
+        GROUP BY bucket ORDER BY bucket
+    ''', ((now - timedelta(days=1)).strftime(BUCKET_FORMAT), now.strftime(BUCKET_FORMAT))).fetchall()
+
+def build_current_data(db):
+    with db.reader() as conn:
+        current_data = current_rows(conn)
     
-    return jsonify({
+    return {
         'zones': [{'zone': zone, 'load': load, 'price': price, 'congestion': cong} 
                  for zone, load, price, cong in current_data],
         'timestamp': datetime.now().isoformat(),
         'status': 'active'
-    })
+    }
 
-@app.route('/api/fuel-mix')
-def get_fuel_mix():
-    cursor = collector.db_connection.cursor()
-    
-    cursor.execute('''
-        SELECT fuel_type, generation_mw, percentage
-        FROM fuel_mix_data 
-        WHERE created_at = (SELECT MAX(created_at) FROM fuel_mix_data)
-        ORDER BY percentage DESC
-    ''')
+def build_fuel_mix(db):
+    with db.reader() as conn:
+        fuel_data = fuel_mix_rows(conn)
+        # Derived when the interval was ingested
+        metrics = conn.execute('''
+            SELECT total_mw, renewable_share, carbon_intensity
+            FROM fuel_mix_intervals
+            ORDER BY ts DESC LIMIT 1
+        ''').fetchone() or (None, None, None)
     
-    fuel_data = cursor.fetchall()
-    
-    return jsonify({
+    return {
         'fuel_mix': [{'fuel': fuel, 'generation': gen, 'percentage': pct} 
                     for fuel, gen, pct in fuel_data],
+        'total_generation': metrics[0],
+        'renewable_share': metrics[1],
+        'carbon_intensity': metrics[2],
         'timestamp': datetime.now().isoformat()
-    })
+    }
+
+def build_price_history(db):
+    with db.reader() as conn:
+        return columns(['time', 'lbmp_avg'], price_history_rows(conn, datetime.now()))
+
+def build_alerts(db):
+    with db.reader() as conn:
+        alerts = alert_rows(conn)
+    
+    return {
+        'alerts': [{'timestamp': ts, 'type': atype, 'zone': zone, 'message': msg, 'value': val} 
+                  for ts, atype, zone, msg, val in alerts]
+    }
+
+def columns(names, rows):
+    """Rows transposed into one list per column"""
+    values = list(zip(*rows)) or [()] * len(names)
+    return {name: list(column) for name, column in zip(names, values)}
+
+def build_snapshot(db):
+    """Everything the dashboard shows, read in one transaction, column-oriented"""
+    now = datetime.now()
+    with db.reader() as conn:
+        # Every query below sees the same committed state
+        conn.execute('BEGIN')
+        snapshot = {
+            'zones': columns(['zone', 'load', 'price', 'congestion'], current_rows(conn)),
+            'fuel_mix': columns(['fuel', 'generation', 'percentage'], fuel_mix_rows(conn)),
+            'alerts': columns(['timestamp', 'type', 'zone', 'message', 'value'], alert_rows(conn)),
+            'price_history': columns(['time', 'lbmp_avg'], price_history_rows(conn, now)),
+        }
+        conn.execute('COMMIT')
+    
+    snapshot['timestamp'] = now.isoformat()
+    return snapshot
+
+def encode_json(state, snapshot):
+    return state.app.json.dumps(snapshot, separators=(',', ':')).encode()
+
+def encode_arrow(state, snapshot):
+    # One row whose columns are the sections, each a struct of per-field lists
+    import pyarrow as pa
+    
+    table = pa.Table.from_pylist([snapshot])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# Media type -> (short name for cache keys and ETags, encoder)
+SNAPSHOT_FORMATS = {
+    'application/json': ('json', encode_json),
+    'application/vnd.apache.arrow.stream': ('arrow', encode_arrow),
+}
 
-@app.route('/api/alerts')
+# Sections of a stream event, and the changed datasets that refresh them
+STREAM_SECTIONS = {
+    'current': ('current-data', build_current_data, 'realtime'),
+    # Stream only, so realtime deltas redraw the price chart without a snapshot request
+    'price_history': ('price-history', build_price_history, 'realtime'),
+    'fuel_mix': ('fuel-mix', build_fuel_mix, 'fuel_mix'),
+    'alerts': ('alerts', build_alerts, 'alerts'),
+}
+
+def stream_payload(state, sections):
+    # Reuses the cached endpoint bodies, so a snapshot or delta costs at most
+    # one query per section no matter how many clients receive it
+    parts = []
+    for section in sections:
+        key, build, _ = STREAM_SECTIONS[section]
+        parts.append(f'"{section}":' + cached_body(state, key, build)[1].decode().strip())
+    return '{' + ','.join(parts) + '}'
+
+def publish_delta(state, changed):
+    sections = [section for section, (_, _, dataset) in STREAM_SECTIONS.items() if dataset in changed]
+    if sections:
+        state.broadcaster.publish('delta', stream_payload(state, sections))
+
+@bp.route('/api/snapshot')
+def get_snapshot():
+    """All dashboard state in one response, as JSON or Arrow IPC and optionally gzipped"""
+    state = dashboard_state()
+    mimetype = request.accept_mimetypes.best_match(list(SNAPSHOT_FORMATS), default='application/json')
+    name, encode = SNAPSHOT_FORMATS[mimetype]
+    compress = 'gzip' in request.accept_encodings
+    variant = name + ('-gzip' if compress else '')
+    
+    def build(db):
+        body = encode(state, build_snapshot(db))
+        return gzip.compress(body, compresslevel=6) if compress else body
+    
+    # Each encoding is produced once per data version however many clients ask
+    etag, body = state.response_cache.get(f'snapshot-{variant}', state.versions.data_version,
+                                          lambda: build(state.db))
+    response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(f'{etag}-{variant}')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@bp.route('/api/current-data')
+def get_current_data():
+    return cached_json('current-data', build_current_data)
+
+@bp.route('/api/fuel-mix')
+def get_fuel_mix():
+    return cached_json('fuel-mix', build_fuel_mix)
+
+@bp.route('/api/alerts')
 def get_alerts():
-    cursor = collector.db_connection.cursor()
+    return cached_json('alerts', build_alerts)
+
+# Streams are recycled periodically; EventSource reconnects with Last-Event-ID
+STREAM_MAX_SECONDS = 300
+STREAM_KEEPALIVE_SECONDS = 15
+# Open streams per worker; below the Procfile's 32 threads
+STREAM_MAX_CLIENTS = 24
+STREAM_RETRY_SECONDS = 60
+
+@bp.route('/api/stream')
+def stream():
+    # The generator outlives the request context, so it keeps its own reference
+    state = dashboard_state()
+    broadcaster = state.broadcaster
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is not None and last_id > broadcaster.last_id:
+        # Issued by another worker or before a restart
+        last_id = None
     
-    cursor.execute('''
-        SELECT timestamp, alert_type, zone, message, value
-        FROM alerts_log 
-        ORDER BY created_at DESC 
-        LIMIT 10
-    ''')
+    if not state.stream_slots.acquire(blocking=False):
+        # EventSource gives up on a 503 and the dashboard falls back to polling
+        response = jsonify({'error': 'too many open streams; poll /api/snapshot instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_SECONDS)
+        return response
     
-    alerts = cursor.fetchall()
+    def generate():
+        after_id = broadcaster.last_id if last_id is None else last_id
+        yield b'retry: 5000\n\n'
+        if last_id is None:
+            yield f'event: snapshot\ndata: {stream_payload(state, STREAM_SECTIONS)}\n\n'.encode()
+        
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events = broadcaster.wait(after_id, STREAM_KEEPALIVE_SECONDS)
+            after_id = broadcaster.last_id if events is None else after_id + len(events)
+            if events is None:
+                # Fell too far behind to replay, so start over from current state
+                yield f'event: snapshot\ndata: {stream_payload(state, STREAM_SECTIONS)}\n\n'.encode()
+            elif events:
+                yield b''.join(events)
+            else:
+                yield b': keepalive\n\n'
     
-    return jsonify({
-        'alerts': [{'timestamp': ts, 'type': atype, 'zone': zone, 'message': msg, 'value': val} 
-                  for ts, atype, zone, msg, val in alerts]
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
+    # Called by the server once the stream ends or the client goes away
+    response.call_on_close(state.stream_slots.release)
+    return response
+
+def submit_refresh(state):
+    """The refresh job this request joins or starts, or a 429 response"""
+    try:
+        return state.refresh_jobs.submit(), None
+    except RefreshThrottled as e:
+        response = jsonify({
+            'error': str(e),
+            'retry_after': e.retry_after,
+            'last_success_age_seconds': last_success_age(state)
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(int(e.retry_after) + 1)
+        return None, response
 
-@app.route('/api/manual-update')
+@bp.route('/api/refresh', methods=['POST'])
+def start_refresh():
+    job, refused = submit_refresh(dashboard_state())
+    if refused is not None:
+        return refused
+    
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f"/api/refresh/{job['id']}"
+    return response
+
+@bp.route('/api/refresh/<job_id>')
+def refresh_status(job_id):
+    job = dashboard_state().refresh_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown refresh job'}), 404
+    return jsonify(job)
+
+@bp.route('/api/manual-update')
 def manual_update():
-    success = collector.fetch_and_process_data()
+    # Kept for older clients; no longer waits for the collection cycle
+    job, refused = submit_refresh(dashboard_state())
+    if refused is not None:
+        return refused
     return jsonify({
-        'success': success,
-        'message': 'Data updated successfully',
+        'success': True,
+        'message': 'Data update started',
+        'job': job,
         'timestamp': datetime.now().isoformat()
     })
 
-@app.route('/health')
+def last_success_age(state):
+    """Seconds since the collecting process last finished a cycle without errors"""
+    with state.db.reader() as conn:
+        last = state.stats.value(conn, 'nyiso_collector_last_success_timestamp_seconds')
+    return None if last is None else time.time() - last
+
+@bp.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    state = dashboard_state()
+    age = last_success_age(state)
+    stale = age is None or age > STALE_SECONDS
+    return jsonify({
+        'status': 'degraded' if stale else 'healthy',
+        'collector': state.collector_mode,
+        'last_success_age_seconds': age,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@bp.route('/metrics')
+def metrics():
+    state = dashboard_state()
+    lines = REGISTRY.render()
+    with state.db.reader() as conn:
+        lines += state.stats.render(conn)
+    
+    age = last_success_age(state)
+    lines += ['# HELP nyiso_collector_last_success_age_seconds Seconds since the last cycle without errors',
+              '# TYPE nyiso_collector_last_success_age_seconds gauge']
+    if age is not None:
+        lines.append(f'nyiso_collector_last_success_age_seconds {age}')
+    
+    lines += ['# HELP nyiso_db_size_bytes Size of the database files',
+              '# TYPE nyiso_db_size_bytes gauge']
+    for label, path in (('db', state.db.path), ('wal', state.db.path + '-wal')):
+        if os.path.exists(path):
+            lines.append(f'nyiso_db_size_bytes{{file="{label}"}} {os.path.getsize(path)}')
+    
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 # API endpoints for compatibility
-@app.route('/api/realtime_load')
+@bp.route('/api/realtime_load')
 def get_realtime_load():
-    cursor = collector.db_connection.cursor()
-    cursor.execute('''
-        SELECT zone, load_mw, timestamp FROM realtime_data 
-        WHERE created_at = (SELECT MAX(created_at) FROM realtime_data)
-        ORDER BY zone
-    ''')
-    data = cursor.fetchall()
-    return jsonify([{'zone': zone, 'load_mw': load, 'timestamp': ts} for zone, load, ts in data])
+    def build(db):
+        with db.reader() as conn:
+            data = conn.execute('''
+                SELECT zone, load_mw, timestamp FROM realtime_latest
+                ORDER BY zone
+            ''').fetchall()
+        return [{'zone': zone, 'load_mw': load, 'timestamp': ts} for zone, load, ts in data]
+    
+    return cached_json('realtime_load', build)
 
-@app.route('/api/realtime_lbmp')
+@bp.route('/api/realtime_lbmp')
 def get_realtime_lbmp():
-    cursor = collector.db_connection.cursor()
-    cursor.execute('''
-        SELECT zone, lbmp, timestamp FROM realtime_data 
-        WHERE created_at = (SELECT MAX(created_at) FROM realtime_data)
-        ORDER BY zone
-    ''')
-    data = cursor.fetchall()
-    return jsonify([{'zone': zone, 'lbmp': lbmp, 'timestamp': ts} for zone, lbmp, ts in data])
+    def build(db):
+        with db.reader() as conn:
+            data = conn.execute('''
+                SELECT zone, lbmp, timestamp FROM realtime_latest
+                ORDER BY zone
+            ''').fetchall()
+        return [{'zone': zone, 'lbmp': lbmp, 'timestamp': ts} for zone, lbmp, ts in data]
+    
+    return cached_json('realtime_lbmp', build)
 
-@app.route('/api/predict_load')
-def predict_load():
-    # Simple prediction based on historical averages
-    cursor = collector.db_connection.cursor()
-    cursor.execute('''
-        SELECT AVG(load_mw) FROM realtime_data 
-        WHERE datetime(created_at) > datetime('now', '-1 hour')
-    ''')
-    result = cursor.fetchone()
-    avg_load = result[0] if result[0] else 15000
-    
-    # Add some variation for prediction
-    predicted_load = avg_load + np.random.normal(0, 500)
+@bp.route('/api/history')
+def get_history():
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else end - timedelta(days=1)
+        rollup = choose_rollup(start, end, request.args.get('resolution', 'auto'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    state = dashboard_state()
+    zones = [zone for zone in request.args.get('zone', '').split(',') if zone]
+    with state.db.reader() as conn:
+        if rollup == '5min':
+            # Only 5-minute points can reach into the archive
+            series = state.archive().history(conn, rollup, zones, start, end)
+        else:
+            series = query_history(conn, rollup, zones, start, end)
     
     return jsonify({
-        'predicted_load': predicted_load,
-        'confidence': 0.85,
-        'timestamp': datetime.now().isoformat()
+        'resolution': rollup,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': series
     })
 
+@bp.route('/api/export')
+def export():
+    """Stream a history range as CSV, NDJSON or Parquet, one fetchmany chunk at a time"""
+    dataset = request.args.get('dataset', 'realtime')
+    fmt = request.args.get('format', 'csv')
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'dataset must be one of {sorted(EXPORT_DATASETS)}, '
+                                 f'format one of {sorted(EXPORT_FORMATS)}'}), 400
+    try:
+        end = datetime.fromisoformat(request.args['end']) if 'end' in request.args else datetime.now()
+        start = datetime.fromisoformat(request.args['start']) if 'start' in request.args else end - timedelta(days=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # The generator outlives the request context, so it keeps its own reference
+    state = dashboard_state()
+    names = [name for name in request.args.get('zone', request.args.get('fuel', '')).split(',') if name]
+    mimetype, encode = EXPORT_FORMATS[fmt]
+    body = encode(export_columns(dataset), export_chunks(state.db, state.archive, dataset, start, end, names))
+    # No Content-Length, so the body goes out with chunked transfer encoding
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="nyiso-{dataset}-{start:%Y%m%d%H%M}-{end:%Y%m%d%H%M}.{fmt}"'
+    })
+
+def build_analytics(db):
+    with db.reader() as conn:
+        rows = conn.execute('SELECT window_name, payload FROM zone_analytics').fetchall()
+    return {name: json.loads(payload) for name, payload in rows}
+
+@bp.route('/api/analytics')
+def get_analytics():
+    """Cross-zone spreads, correlations and congestion percentiles, kept current by the collector"""
+    zones = [zone for zone in request.args.get('zone', '').split(',') if zone]
+    window = request.args.get('window')
+    if window is None and not zones:
+        return cached_json('analytics', build_analytics)
+    
+    # Parsed from the cached body, so a request never touches the database
+    payload = json.loads(cached_body(dashboard_state(), 'analytics', build_analytics)[1])
+    if window is not None and window not in payload:
+        return jsonify({'error': f"unknown window {window!r}, expected one of {', '.join(payload)}"}), 400
+    selected = {window: payload[window]} if window is not None else payload
+    if zones:
+        for summary in selected.values():
+            keep = [i for i, zone in enumerate(summary['zones']) if zone in zones]
+            summary['zones'] = [summary['zones'][i] for i in keep]
+            for name in ('spread_mean', 'spread_std', 'correlation'):
+                summary[name] = [[summary[name][i][j] for j in keep] for i in keep]
+            summary['congestion_percentiles'] = {
+                zone: stats for zone, stats in summary['congestion_percentiles'].items() if zone in zones}
+    return jsonify(selected[window] if window is not None else selected)
+
+def build_forecast(db):
+    with db.reader() as conn:
+        rows = conn.execute('''
+            SELECT zone, horizon_hours, target_time, load_mw, confidence, model_version, generated_at
+            FROM load_forecasts
+            ORDER BY zone, horizon_hours
+        ''').fetchall()
+    
+    zones = {}
+    system = {}
+    for zone, horizon, target, load, confidence, _, _ in rows:
+        zones.setdefault(zone, []).append(
+            {'horizon_hours': horizon, 'target_time': target, 'load_mw': load, 'confidence': confidence})
+        total = system.setdefault(horizon, {'horizon_hours': horizon, 'target_time': target, 'load_mw': 0.0})
+        total['load_mw'] += load or 0.0
+    return {
+        'model_version': rows[0][5] if rows else None,
+        'generated_at': rows[0][6] if rows else None,
+        # NYISO-wide load, summed across zones
+        'system': [system[horizon] for horizon in sorted(system)],
+        'zones': zones
+    }
+
+@bp.route('/api/forecast')
+def get_forecast():
+    # Every zone and horizon, predicted in one batch by the collector
+    return cached_json('forecast', build_forecast)
+
+@bp.route('/api/predict_load')
+def predict_load():
+    def build(db):
+        with db.reader() as conn:
+            # Kept as the average zone's load, as this endpoint always reported;
+            # the NYISO-wide total is on /api/forecast
+            load, confidence, version = conn.execute('''
+                SELECT AVG(load_mw), AVG(confidence), MIN(model_version)
+                FROM load_forecasts WHERE horizon_hours = 1
+            ''').fetchone()
+            if load is None:
+                # No trained model yet: persistence forecast from the latest loads
+                load, = conn.execute('SELECT AVG(load_mw) FROM realtime_latest').fetchone()
+        
+        return {
+            'predicted_load': load if load is not None else 15000,
+            'confidence': confidence if confidence is not None else 0.85,
+            'model_version': version,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    return cached_json('predict_load', build)
+
 if __name__ == '__main__':
     print("🚀 Starting NYISO Dashboard...")
     print("📊 Dashboard available at: http://localhost:5000")
@@ -555,8 +949,4 @@ if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     
     # Run the app
-    app.run(host='0.0.0.0', port=port, debug=False)
-    import io
-    collector.start_collection()
-    app.run(debug=True)
-
+    create_app().run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,266 @@
+"""Cold tier for closed days of the history tables.
+
+    python archive.py --retention-days 30
+
+Days older than the retention window are moved out of SQLite into one
+compressed Arrow IPC file per table and day, under
+
+    archive/<table>/<YYYY-MM>/<YYYY-MM-DD>.arrow
+
+with zone and fuel names dictionary-encoded. archive_partitions lists the
+files. Partitions are read through a memory map, and range reads merge the
+archive with whatever is still in SQLite, the SQLite row winning when a
+day is present in both.
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from rollups import BUCKET_FORMAT, EPOCH, METRICS, epoch_of, parse_timestamps, query_history, rollup_rows
+from schema import ROW_VIEWS
+
+# Table -> (key columns, dictionary-encoded columns, archived columns)
+TABLES = {
+    'realtime_data': (
+        ['ts', 'zone'], ['zone'],
+        ['timestamp', 'zone', 'load_mw', 'lbmp', 'congestion', 'created_at'],
+    ),
+    'fuel_mix_data': (
+        ['ts', 'fuel_type'], ['fuel_type'],
+        ['timestamp', 'fuel_type', 'generation_mw', 'percentage', 'created_at'],
+    ),
+    'alerts_log': (
+        ['timestamp', 'alert_type', 'zone'], ['alert_type', 'zone'],
+        ['timestamp', 'alert_type', 'zone', 'message', 'value', 'created_at'],
+    ),
+}
+
+
+def _in_chunks(conn, sql, values, size=500):
+    """Run sql once per chunk of values, substituting the placeholder list for {}"""
+    rows = []
+    for i in range(0, len(values), size):
+        chunk = values[i:i + size]
+        rows += conn.execute(sql.format(', '.join('?' * len(chunk))), chunk).fetchall()
+    return rows
+
+
+def day_conditions(conn, table, before=None):
+    """Per calendar day with rows (older than before), the WHERE clauses that select that day"""
+    if table in ROW_VIEWS:
+        # Epoch-keyed tables are cut into days straight off the ts index
+        limit = '' if before is None else f'WHERE ts < {epoch_of(before)}'
+        days = [day for day, in conn.execute(f'SELECT DISTINCT ts / 86400 FROM {table} {limit}')]
+        return {(EPOCH + timedelta(days=day)).date(): [('ts >= ? AND ts < ?', [day * 86400, (day + 1) * 86400])]
+                for day in days}
+
+    conditions = {}
+    for day, stamps in timestamps_by_day(conn, table, end=before).items():
+        conditions[day] = [(f"timestamp IN ({', '.join('?' * len(stamps[i:i + 500]))})", stamps[i:i + 500])
+                           for i in range(0, len(stamps), 500)]
+    return conditions
+
+
+def timestamps_by_day(conn, table, start=None, end=None):
+    """Distinct timestamp strings of a table grouped by calendar day, optionally within [start, end)"""
+    stamps = [ts for ts, in conn.execute(f'SELECT DISTINCT timestamp FROM {table}')]
+    if not stamps:
+        return {}
+    parsed = parse_timestamps(stamps)
+    keep = parsed.notna()
+    if start is not None:
+        keep &= parsed >= start
+    if end is not None:
+        keep &= parsed < end
+
+    frame = pd.DataFrame({'timestamp': stamps, 'day': parsed.dt.date})[keep.to_numpy()]
+    return {day: group.tolist() for day, group in frame.groupby('day')['timestamp']}
+
+
+class Archive:
+    """Compressed per-day partition files plus the catalogue in archive_partitions"""
+
+    def __init__(self, db, root=None, compression=None):
+        self.db = db
+        self.root = root or os.environ.get('NYISO_ARCHIVE_DIR', 'archive')
+        # lz4 or zstd; 'none' keeps the files uncompressed so reads are fully zero-copy
+        compression = compression or os.environ.get('NYISO_ARCHIVE_COMPRESSION', 'lz4')
+        self.compression = None if compression == 'none' else compression
+
+    def path_for(self, table, day):
+        return os.path.join(self.root, table, f'{day:%Y-%m}', f'{day:%Y-%m-%d}.arrow')
+
+    def archived_days(self, conn, table):
+        rows = conn.execute('SELECT day, path FROM archive_partitions WHERE table_name = ?', (table,))
+        return {datetime.strptime(day, '%Y-%m-%d').date(): path for day, path in rows}
+
+    def read_partition(self, path):
+        # Buffers point into the mapped file; only compressed ones are copied
+        with pa.memory_map(path) as source:
+            return ipc.open_file(source).read_all()
+
+    def write_partition(self, table, day, frame):
+        """Write one day of rows, merged over any partition already written for it"""
+        keys, dictionary_columns, columns = TABLES[table]
+        path = self.path_for(table, day)
+        frame = frame[columns].assign(ts=parse_timestamps(frame['timestamp']).to_numpy())
+        if os.path.exists(path):
+            existing = self.read_partition(path).to_pandas()
+            frame = pd.concat([existing, frame]).drop_duplicates(subset=keys, keep='last')
+
+        frame = frame.sort_values('ts', kind='stable')
+        arrow = pa.Table.from_pandas(frame, preserve_index=False)
+        for column in dictionary_columns:
+            arrow = arrow.set_column(arrow.schema.get_field_index(column), column,
+                                     pc.dictionary_encode(arrow[column]))
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        options = ipc.IpcWriteOptions(compression=self.compression)
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with ipc.new_file(sink, arrow.schema, options=options) as writer:
+                writer.write_table(arrow)
+        os.replace(path + '.tmp', path)
+        return path, len(frame)
+
+    def read_cold(self, conn, table, start, end, zones=None, days=None):
+        """Archived rows of a table within [start, end), or on the given days"""
+        archived = self.archived_days(conn, table)
+        if days is not None:
+            paths = [archived[day] for day in days if day in archived]
+        else:
+            paths = [path for day, path in sorted(archived.items()) if start.date() <= day <= end.date()]
+
+        keys, _, columns = TABLES[table]
+        parts = []
+        for path in paths:
+            partition = self.read_partition(path)
+            mask = None
+            if days is None:
+                mask = pc.and_(pc.greater_equal(partition['ts'], pa.scalar(start, pa.timestamp('ns'))),
+                               pc.less(partition['ts'], pa.scalar(end, pa.timestamp('ns'))))
+            if zones and 'zone' in keys:
+                in_zones = pc.is_in(partition['zone'].cast(pa.string()), pa.array(zones))
+                mask = in_zones if mask is None else pc.and_(mask, in_zones)
+            if mask is not None:
+                partition = partition.filter(mask)
+            parts.append(partition.to_pandas())
+
+        if not parts:
+            return pd.DataFrame(columns=columns + ['ts'])
+        frame = pd.concat(parts, ignore_index=True)
+        for column in TABLES[table][1]:
+            frame[column] = frame[column].astype(str)
+        return frame
+
+    def read_hot(self, conn, table, start, end, zones=None):
+        """Rows still in SQLite within [start, end)"""
+        _, _, columns = TABLES[table]
+        if table in ROW_VIEWS:
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM {ROW_VIEWS[table]} WHERE ts >= ? AND ts < ?",
+                                (epoch_of(start), epoch_of(end))).fetchall()
+        else:
+            stamps = [ts for day_stamps in timestamps_by_day(conn, table, start, end).values() for ts in day_stamps]
+            rows = _in_chunks(conn, f"SELECT {', '.join(columns)} FROM {table} WHERE timestamp IN ({{}})", stamps)
+        frame = pd.DataFrame(rows, columns=columns)
+        if zones and 'zone' in frame:
+            frame = frame[frame['zone'].isin(zones)]
+        return frame.assign(ts=parse_timestamps(frame['timestamp']).to_numpy())
+
+    def read_range(self, conn, table, start, end, zones=None):
+        """Rows of a table within [start, end) from both tiers, oldest first"""
+        keys = TABLES[table][0]
+        frame = pd.concat([self.read_cold(conn, table, start, end, zones),
+                           self.read_hot(conn, table, start, end, zones)], ignore_index=True)
+        frame = frame.drop_duplicates(subset=keys, keep='last')
+        return frame.sort_values('ts', kind='stable').reset_index(drop=True)
+
+    def history(self, conn, rollup, zones, start, end):
+        """query_history, with 5-minute points for archived days rebuilt from the archive"""
+        series = query_history(conn, rollup, zones, start, end)
+        if rollup != '5min':
+            return series
+
+        cold = self.read_cold(conn, 'realtime_data', start, end, zones)
+        if cold.empty:
+            return series
+
+        # Revisions written to archived days since they were archived win, as in read_range
+        hot = self.read_hot(conn, 'realtime_data', start, end, zones)
+        hot = hot[hot['ts'].dt.date.isin(set(cold['ts'].dt.date))]
+        cold = pd.concat([cold, hot], ignore_index=True).drop_duplicates(subset=TABLES['realtime_data'][0], keep='last')
+
+        batch = pd.DataFrame({'zone': cold['zone'], 'ts': cold['ts'], 'samples': 1})
+        for metric, column in METRICS.items():
+            batch[metric] = batch[f'{metric}_delta'] = cold[column].to_numpy()
+
+        keys = ['time', 'samples'] + [f'{metric}_{stat}' for metric in METRICS
+                                      for stat in ('avg', 'min', 'max', 'last')]
+        for zone, bucket, samples, _, *stats in rollup_rows(batch, '5min'):
+            values = [bucket, int(samples)]
+            for i in range(0, len(stats), 4):
+                values += [stats[i] / samples] + stats[i + 1:i + 4]
+            series.setdefault(zone, []).append(dict(zip(keys, values)))
+        for points in series.values():
+            points.sort(key=lambda point: point['time'])
+        return series
+
+    def archive_closed_days(self, retention_days, now=None, log=print):
+        """Move every day older than the retention window to the archive; returns rows moved per table"""
+        cutoff = (now or datetime.now()).date() - timedelta(days=retention_days)
+        moved = dict.fromkeys(TABLES, 0)
+        for table, (_, _, columns) in TABLES.items():
+            source = ROW_VIEWS.get(table, table)
+            with self.db.reader() as conn:
+                closed = day_conditions(conn, table, before=datetime.combine(cutoff, datetime.min.time()))
+
+            for day, conditions in sorted(closed.items()):
+                # Held for the whole day so no write can land between the copy and the delete
+                with self.db.writer() as conn:
+                    rows = []
+                    for condition, params in conditions:
+                        rows += conn.execute(f"SELECT {', '.join(columns)} FROM {source} WHERE {condition}",
+                                             params).fetchall()
+                    path, total = self.write_partition(table, day, pd.DataFrame(rows, columns=columns))
+                    for condition, params in conditions:
+                        conn.execute(f'DELETE FROM {table} WHERE {condition}', params)
+                    if table == 'realtime_data':
+                        # Hourly and daily rollups stay; 5-minute points are rebuilt from the archive
+                        next_day = day + timedelta(days=1)
+                        conn.execute('DELETE FROM realtime_rollup_5min WHERE bucket >= ? AND bucket < ?',
+                                     (day.strftime(BUCKET_FORMAT), next_day.strftime(BUCKET_FORMAT)))
+                    conn.execute('''
+                        INSERT OR REPLACE INTO archive_partitions (table_name, day, rows, path)
+                        VALUES (?, ?, ?, ?)
+                    ''', (table, day.isoformat(), total, path))
+                moved[table] += len(rows)
+                log(f"{table}: archived {day} ({len(rows)} rows)")
+        return moved
+
+
+def main(argv=None):
+    from collector import NYISOCollector
+    from db import ConnectionManager
+
+    parser = argparse.ArgumentParser(description='Move closed days of nyiso.db into the columnar archive')
+    parser.add_argument('--retention-days', type=int, default=int(os.environ.get('NYISO_RETENTION_DAYS', '30')),
+                        help='days kept in SQLite (default: NYISO_RETENTION_DAYS or 30)')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM the database afterwards')
+    parser.add_argument('--db', default=None, help='database path (default: NYISO_DB_PATH or nyiso.db)')
+    args = parser.parse_args(argv)
+
+    # The collector applies any pending migrations first
+    collector = NYISOCollector(ConnectionManager(args.db))
+    moved = collector.archive.archive_closed_days(args.retention_days)
+    print(f"🗄️ Archived {sum(moved.values())} rows older than {args.retention_days} days")
+    if args.vacuum:
+        with collector.db.writer() as conn:
+            conn.execute('VACUUM')
+
+
+if __name__ == '__main__':
+    main()
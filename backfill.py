@@ -0,0 +1,178 @@
+"""Load historical NYISO MIS archives into nyiso.db.
+
+    python backfill.py --start 2024-01-01 --end 2024-12-31
+    python backfill.py --start 2024-06-01 --end 2024-06-30 --source ./fixtures
+
+Each month is fetched and parsed in a worker process, from the monthly
+``*_csv.zip`` archive when there is one and from the daily CSVs otherwise.
+The main process writes the parsed months through the collector's upsert
+path as they arrive, keeping only a few months in memory. Finished days are
+recorded in backfill_progress, so re-running a range skips them.
+"""
+import argparse
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import requests
+
+from collector import NYISOCollector, prepare_fuel_mix_frame, prepare_pricing_frame
+from db import ConnectionManager
+from fetcher import DEFAULT_BASE_URL
+
+# Feed -> (MIS directory, file name stem, frame preparer)
+ARCHIVES = {
+    'realtime_lbmp': ('realtime', 'realtime_zone', prepare_pricing_frame),
+    'fuel_mix': ('rtfuelmix', 'rtfuelmix', prepare_fuel_mix_frame),
+}
+
+_session = None
+
+
+def _init_worker():
+    global _session
+    _session = requests.Session()
+    # Forked workers would otherwise share one random stream for simulated load
+    np.random.seed()
+
+
+def read_source(source, path):
+    """Contents of a file under an MIS base URL or a local mirror, or None"""
+    if source.startswith(('http://', 'https://')):
+        response = (_session or requests).get(f'{source}/{path}', timeout=60)
+        return response.content if response.status_code == 200 else None
+
+    full_path = os.path.join(source, path)
+    if not os.path.exists(full_path):
+        return None
+    with open(full_path, 'rb') as f:
+        return f.read()
+
+
+def load_month(feed, source, days):
+    """Runs in a worker: parse the given days of one month of one feed"""
+    directory, stem, prepare = ARCHIVES[feed]
+    month = days[0]
+    results = []
+
+    archive = read_source(source, f'{directory}/{month:%Y%m}01{stem}_csv.zip')
+    if archive is not None:
+        with zipfile.ZipFile(BytesIO(archive)) as zf:
+            members = set(zf.namelist())
+            for day in days:
+                member = f'{day:%Y%m%d}{stem}.csv'
+                frame = prepare(pd.read_csv(zf.open(member))) if member in members else None
+                results.append((day, frame))
+        return results
+
+    for day in days:
+        content = read_source(source, f'{directory}/{day:%Y%m%d}{stem}.csv')
+        frame = prepare(pd.read_csv(BytesIO(content))) if content is not None else None
+        results.append((day, frame))
+    return results
+
+
+def months_between(start, end):
+    """Days from start to end inclusive, grouped by calendar month"""
+    months = {}
+    day = start
+    while day <= end:
+        months.setdefault((day.year, day.month), []).append(day)
+        day += timedelta(days=1)
+    return list(months.values())
+
+
+def completed_days(db, feed):
+    with db.reader() as conn:
+        rows = conn.execute('SELECT day FROM backfill_progress WHERE feed = ?', (feed,)).fetchall()
+    return {date.fromisoformat(day) for day, in rows}
+
+
+def backfill(collector, feeds, start, end, source, workers=None, log=print):
+    """Load every missing day in [start, end]; returns rows written per feed"""
+    writers = {
+        'realtime_lbmp': collector.write_pricing_frame,
+        'fuel_mix': collector.write_fuel_mix_frame,
+    }
+    jobs = []
+    for feed in feeds:
+        done = completed_days(collector.db, feed)
+        for days in months_between(start, end):
+            pending = [day for day in days if day not in done]
+            if pending:
+                jobs.append((feed, pending))
+
+    workers = workers or os.cpu_count()
+    totals = dict.fromkeys(feeds, 0)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Bounded window of in-flight months keeps memory flat for long ranges
+        jobs = iter(jobs)
+        in_flight = {}
+        while True:
+            while len(in_flight) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                feed, days = job
+                in_flight[pool.submit(load_month, feed, source, days)] = feed
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                feed = in_flight.pop(future)
+                results = future.result()
+                loaded = [(day, frame) for day, frame in results if frame is not None]
+                missing = len(results) - len(loaded)
+                if not loaded:
+                    log(f"{feed}: no data for {missing} day(s)")
+                    continue
+
+                written = writers[feed](pd.concat([frame for _, frame in loaded]), update_latest=False)
+                with collector.db.writer() as conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO backfill_progress (feed, day, rows)
+                        VALUES (?, ?, ?)
+                    ''', [(feed, day.isoformat(), len(frame)) for day, frame in loaded])
+
+                totals[feed] += written
+                first, last = loaded[0][0], loaded[-1][0]
+                log(f"{feed}: {first} to {last} loaded, {written} rows written"
+                    + (f", {missing} day(s) missing" if missing else ""))
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill NYISO history into nyiso.db')
+    parser.add_argument('--start', required=True, type=date.fromisoformat, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help='last day, YYYY-MM-DD (default: yesterday)')
+    parser.add_argument('--feeds', default=','.join(ARCHIVES), help='comma-separated feeds to load')
+    parser.add_argument('--source', default=os.environ.get('NYISO_MIS_BASE_URL', DEFAULT_BASE_URL),
+                        help='MIS base URL or a local directory with the same layout')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes (default: CPU count)')
+    parser.add_argument('--db', default=None, help='database path (default: NYISO_DB_PATH or nyiso.db)')
+    args = parser.parse_args(argv)
+
+    feeds = [feed.strip() for feed in args.feeds.split(',') if feed.strip()]
+    unknown = set(feeds) - set(ARCHIVES)
+    if unknown:
+        parser.error(f"unknown feed(s): {', '.join(sorted(unknown))}")
+
+    collector = NYISOCollector(ConnectionManager(args.db))
+    started = time.monotonic()
+    print(f"📥 Backfilling {', '.join(feeds)} from {args.start} to {args.end} ({args.source})")
+    totals = backfill(collector, feeds, args.start, args.end, args.source, args.workers)
+
+    elapsed = time.monotonic() - started
+    rows = sum(totals.values())
+    print(f"✅ {rows} rows written in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""Synthetic data and benchmarks for the dashboard.
+
+    python -m bench.synthetic --days 365            # a year of history into nyiso.db
+    python -m bench --output bench_results.jsonl    # run every benchmark
+
+See bench/__main__.py for the individual benchmarks and their options.
+"""
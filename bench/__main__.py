@@ -0,0 +1,361 @@
+"""Run the benchmarks and report machine-readable results.
+
+    python -m bench                                   # everything, JSON to stdout
+    python -m bench --only ingest,alerts --output bench_results.jsonl
+    python -m bench --only endpoints --url http://localhost:5000 --clients 200
+    python -m bench --only startup --startup-runs 20
+    python -m bench --only replay --replay-days 2
+
+Every run works on throwaway databases in a temporary directory, seeded
+with --days of synthetic history. Results are one JSON document per run:
+
+    {"run_at": ..., "commit": ..., "config": {...},
+     "results": [{"benchmark": "ingest", "metric": "rows_per_s", "value": ..., "unit": "rows/s"}, ...]}
+
+With --output the document is appended as one line, so a file accumulates
+a history of runs to compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import requests
+
+from bench.synthetic import generate_history, populate, raw_pricing_csv, write_recordings
+
+ENDPOINTS = [
+    '/api/snapshot',
+    '/api/current-data',
+    '/api/fuel-mix',
+    '/api/alerts',
+    '/api/realtime_load',
+    '/api/realtime_lbmp',
+    '/api/predict_load',
+    '/api/forecast',
+    '/api/history?resolution=hour',
+    '/health',
+]
+
+
+def result(benchmark, metric, value, unit, **labels):
+    return {'benchmark': benchmark, 'metric': metric, 'value': round(float(value), 6), 'unit': unit, **labels}
+
+
+def latency_results(benchmark, samples, **labels):
+    samples = np.asarray(samples) * 1000
+    return [
+        result(benchmark, 'p50', np.percentile(samples, 50), 'ms', **labels),
+        result(benchmark, 'p99', np.percentile(samples, 99), 'ms', **labels),
+        result(benchmark, 'mean', samples.mean(), 'ms', **labels),
+    ]
+
+
+def history_start(days):
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    return today - timedelta(days=days - 1)
+
+
+def bench_ingest(args, workdir):
+    """process_pricing_data on a day-sized MIS file, a repeat of it, and single-interval polls"""
+    from collector import NYISOCollector
+    from db import ConnectionManager
+
+    collector = NYISOCollector(ConnectionManager(os.path.join(workdir, 'ingest.db')))
+    pricing, _ = generate_history(history_start(args.ingest_days), args.ingest_days)
+    days = [raw_pricing_csv(day) for _, day in pricing.groupby(pricing['timestamp'].str[:10], sort=False)]
+
+    started = time.perf_counter()
+    written = sum(collector.process_pricing_data(day) for day in days[:-1])
+    elapsed = time.perf_counter() - started
+    results = [result('ingest', 'rows_per_s', written / elapsed, 'rows/s', mode='new')]
+
+    # The same files again: every row is a duplicate to skip
+    started = time.perf_counter()
+    for day in days[:-1]:
+        collector.process_pricing_data(day)
+    elapsed = time.perf_counter() - started
+    rows = sum(len(day) for day in days[:-1])
+    results.append(result('ingest', 'rows_per_s', rows / elapsed, 'rows/s', mode='duplicate'))
+
+    # The last day as the live collector sees it, one interval per poll
+    polls = []
+    for _, interval in days[-1].groupby('Time Stamp', sort=False):
+        started = time.perf_counter()
+        collector.process_pricing_data(interval)
+        polls.append(time.perf_counter() - started)
+    results += latency_results('ingest', polls, mode='poll')
+    return results
+
+
+def bench_alerts(args, workdir):
+    """AlertEngine cost per live interval and on a large batch"""
+    from alerts import AlertEngine
+
+    pricing, _ = generate_history(history_start(args.days), args.days)
+    engine = AlertEngine()
+    started = time.perf_counter()
+    engine.evaluate(pricing)
+    elapsed = time.perf_counter() - started
+    results = [result('alerts', 'rows_per_s', len(pricing) / elapsed, 'rows/s', mode='batch')]
+
+    intervals = [interval for _, interval in pricing.groupby('timestamp', sort=False)][-288:]
+    engine = AlertEngine()
+    samples = []
+    for interval in intervals:
+        started = time.perf_counter()
+        engine.evaluate(interval)
+        samples.append(time.perf_counter() - started)
+    return results + latency_results('alerts', samples, mode='interval')
+
+
+def bench_replay(args, workdir):
+    """Full collection cycles driven from recorded files with no pacing: the pipeline's ceiling"""
+    from collector import NYISOCollector
+    from db import ConnectionManager
+    from replay import ReplaySource, replay
+
+    directory = os.path.join(workdir, 'recordings')
+    write_recordings(directory, history_start(args.replay_days), args.replay_days)
+    collector = NYISOCollector(ConnectionManager(os.path.join(workdir, 'replay.db')))
+    report = replay(collector, ReplaySource(directory), speedup=0, log=lambda message: None)
+    return [
+        result('replay', 'intervals_per_s', report['max_intervals_per_s'], 'intervals/s'),
+        result('replay', 'rows_per_s', report['max_rows_per_s'], 'rows/s'),
+        result('replay', 'alerts_per_s', report['alerts_per_s'], 'alerts/s'),
+        result('replay', 'snapshots_per_s', report['snapshots_per_s'], 'updates/s'),
+        result('replay', 'cycle_p99', report['cycle_ms_p99'], 'ms'),
+    ]
+
+
+def bench_forecast(args, workdir, collector):
+    """Training, artifact loading and the batch prediction of every zone"""
+    from forecast import LoadForecaster
+
+    model_dir = os.path.join(workdir, 'models')
+    forecaster = LoadForecaster(collector.db, model_dir)
+    started = time.perf_counter()
+    version = forecaster.train()
+    results = [result('forecast', 'train', time.perf_counter() - started, 's')]
+    if version is None:
+        print('forecast: not enough history to train, use --days 14 or more', file=sys.stderr)
+        return results
+
+    size = sum(os.path.getsize(os.path.join(model_dir, name)) for name in os.listdir(model_dir))
+    results.append(result('forecast', 'artifact_size', size / 1e6, 'MB'))
+
+    started = time.perf_counter()
+    LoadForecaster(collector.db, model_dir).model()
+    results.append(result('forecast', 'load', (time.perf_counter() - started) * 1000, 'ms'))
+
+    samples = []
+    for _ in range(20):
+        started = time.perf_counter()
+        with collector.db.reader() as conn:
+            forecaster.predict_all(conn)
+        samples.append(time.perf_counter() - started)
+    collector.forecaster = forecaster
+    collector.refresh_forecasts(force=True)
+    return results + latency_results('forecast', samples, mode='predict_all')
+
+
+# Run in a fresh interpreter per sample, as a gunicorn worker boots
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(collector_mode='off', start_threads=False)
+built = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': built - imported,
+                  'heavy': sorted(name for name in %r if name in sys.modules)}))
+"""
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'sklearn', 'joblib', 'requests')
+
+
+def bench_startup(args, workdir, collector):
+    """Worker cold start: importing app and building the application, per fresh interpreter"""
+    env = dict(os.environ, NYISO_DB_PATH=collector.db.path, NYISO_MODEL_DIR=os.path.join(workdir, 'models'))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = {'process': [], 'import': [], 'create_app': []}
+    heavy = []
+    for _ in range(args.startup_runs):
+        started = time.perf_counter()
+        probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE % (HEAVY_MODULES,)], env=env, cwd=root,
+                               capture_output=True, text=True, check=True)
+        samples['process'].append(time.perf_counter() - started)
+        timings = json.loads(probe.stdout.strip().splitlines()[-1])
+        samples['import'].append(timings['import'])
+        samples['create_app'].append(timings['create_app'])
+        heavy = timings['heavy']
+
+    results = []
+    for phase, values in samples.items():
+        results += latency_results('startup', values, phase=phase)
+    # Anything listed here was imported on the worker boot path
+    results.append(result('startup', 'heavy_modules', len(heavy), 'modules', loaded=','.join(heavy)))
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, workdir, db_path):
+    """gunicorn with the Procfile settings, serving the benchmark database"""
+    port = _free_port()
+    env = dict(os.environ, NYISO_DB_PATH=db_path, NYISO_COLLECTOR='off',
+               NYISO_MODEL_DIR=os.path.join(workdir, 'models'))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:create_app()', '--worker-class', 'gthread', '--threads', '32',
+         '--workers', str(args.workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url + '/health', timeout=1)
+            return server, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError('benchmark server did not start')
+
+
+def bench_endpoints(args, workdir, collector):
+    """Per-endpoint latency with --clients concurrent dashboards"""
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(args, workdir, collector.db.path)
+
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    lock = threading.Lock()
+    per_client = max(1, args.requests // args.clients)
+
+    def client(index):
+        session = requests.Session()
+        timings = []
+        for i in range(per_client):
+            endpoint = ENDPOINTS[(index + i) % len(ENDPOINTS)]
+            started = time.perf_counter()
+            session.get(url + endpoint, timeout=60).raise_for_status()
+            timings.append((endpoint, time.perf_counter() - started))
+        with lock:
+            for endpoint, elapsed in timings:
+                latencies[endpoint].append(elapsed)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            list(pool.map(client, range(args.clients)))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    total = sum(len(samples) for samples in latencies.values())
+    results = [result('endpoints', 'throughput', total / elapsed, 'req/s', clients=args.clients)]
+    for endpoint, samples in latencies.items():
+        if samples:
+            results += latency_results('endpoints', samples, endpoint=endpoint, clients=args.clients)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Benchmark the NYISO dashboard')
+    parser.add_argument('--only', default='ingest,alerts,replay,forecast,endpoints,startup',
+                        help='comma-separated benchmarks to run (default: all)')
+    parser.add_argument('--days', type=int, default=30, help='days of synthetic history to seed (default: 30)')
+    parser.add_argument('--ingest-days', type=int, default=7, help='days fed through ingest (default: 7)')
+    parser.add_argument('--replay-days', type=int, default=1, help='recorded days replayed (default: 1)')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent HTTP clients (default: 50)')
+    parser.add_argument('--requests', type=int, default=5000, help='HTTP requests in total (default: 5000)')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers to start (default: 1)')
+    parser.add_argument('--startup-runs', type=int, default=10,
+                        help='fresh interpreters timed by the startup benchmark (default: 10)')
+    parser.add_argument('--url', default=None, help='benchmark a running server instead of starting one')
+    parser.add_argument('--output', default=None, help='append the results as a JSON line to this file')
+    args = parser.parse_args(argv)
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = set(selected) - {'ingest', 'alerts', 'replay', 'forecast', 'endpoints', 'startup'}
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='nyiso-bench-')
+    results = []
+    try:
+        collector = None
+        if {'forecast', 'endpoints', 'startup'} & set(selected):
+            from collector import NYISOCollector
+            from db import ConnectionManager
+
+            collector = NYISOCollector(ConnectionManager(os.path.join(workdir, 'bench.db')))
+            started = time.perf_counter()
+            populate(collector, history_start(args.days), args.days, log=lambda message: None)
+            results.append(result('seed', 'elapsed', time.perf_counter() - started, 's', days=args.days))
+
+        for name in selected:
+            print(f"⏱️ {name}...", file=sys.stderr)
+            if name == 'ingest':
+                results += bench_ingest(args, workdir)
+            elif name == 'alerts':
+                results += bench_alerts(args, workdir)
+            elif name == 'replay':
+                results += bench_replay(args, workdir)
+            elif name == 'forecast':
+                results += bench_forecast(args, workdir, collector)
+            elif name == 'startup':
+                results += bench_startup(args, workdir, collector)
+            else:
+                results += bench_endpoints(args, workdir, collector)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'run_at': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': vars(args),
+        'results': results,
+    }
+    for row in results:
+        labels = ' '.join(f'{key}={value}' for key, value in row.items()
+                          if key not in ('benchmark', 'metric', 'value', 'unit'))
+        print(f"{row['benchmark']:>10} {row['metric']:<12} {row['value']:>14.3f} {row['unit']:<7} {labels}",
+              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(report) + '\n')
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
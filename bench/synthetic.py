@@ -0,0 +1,189 @@
+"""Vectorized generator of realistic NYISO-shaped histories.
+
+    python -m bench.synthetic --days 365 --start 2024-01-01 --db nyiso.db
+    python -m bench.synthetic --days 3 --recordings recordings/      # CSVs for replay.py
+
+Load follows a daily and seasonal shape with a weekend dip and
+autocorrelated noise. Prices rise with system load (convex, like a supply
+stack), zones east of the Central-East interface carry a congestion premium,
+and N.Y.C. / Long Island the largest. The fuel mix covers system load with
+flat nuclear and hydro, daylight solar, random-walk wind and gas on the
+margin.
+"""
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# Zone -> (mean load MW, congestion premium $/MWh)
+ZONES = {
+    'CAPITL': (1400, 3.0),
+    'CENTRL': (1800, 0.5),
+    'DUNWOD': (700, 6.0),
+    'GENESE': (1100, 0.0),
+    'HUD VL': (1200, 5.0),
+    'LONGIL': (2400, 12.0),
+    'MHK VL': (900, 1.0),
+    'MILLWD': (400, 6.0),
+    'N.Y.C.': (6200, 10.0),
+    'NORTH': (700, -1.0),
+    'WEST': (1900, -0.5),
+}
+
+FUELS = ('Nuclear', 'Hydro', 'Wind', 'Solar', 'Natural Gas', 'Other')
+
+NYISO_FORMAT = '%m/%d/%Y %H:%M:%S'
+
+
+def _intervals(start, days, interval_minutes):
+    return pd.date_range(start, periods=days * 24 * 60 // interval_minutes, freq=f'{interval_minutes}min')
+
+
+def _ar_noise(rng, shape, scale, phi=0.98):
+    """AR(1) noise along axis 0 with the given stationary scale"""
+    shocks = rng.normal(0, scale * np.sqrt(1 - phi ** 2), shape)
+    return lfilter([1], [1, -phi], shocks, axis=0)
+
+
+def generate_history(start, days, interval_minutes=5, seed=0):
+    """Prepared pricing and fuel mix frames covering days from start"""
+    rng = np.random.default_rng(seed)
+    times = _intervals(start, days, interval_minutes)
+    zones = list(ZONES)
+    base = np.array([ZONES[zone][0] for zone in zones])
+    premium = np.array([ZONES[zone][1] for zone in zones])
+
+    hour = times.hour.to_numpy() + times.minute.to_numpy() / 60
+    day_of_year = times.dayofyear.to_numpy()
+    # Morning ramp, evening peak, overnight trough; summer peak over a winter shoulder
+    daily = 1 + 0.18 * np.sin(2 * np.pi * (hour - 9) / 24) + 0.06 * np.sin(4 * np.pi * (hour - 5) / 24)
+    seasonal = 1 + 0.15 * np.cos(2 * np.pi * (day_of_year - 200) / 365) + 0.05 * np.cos(4 * np.pi * day_of_year / 365)
+    weekend = np.where(times.dayofweek.to_numpy() >= 5, 0.92, 1.0)
+    shape = (daily * seasonal * weekend)[:, None]
+
+    load = base * shape * (1 + _ar_noise(rng, (len(times), len(zones)), 0.03))
+    system = load.sum(axis=1, keepdims=True)
+    stress = system / base.sum()
+
+    energy = 18 + 22 * stress ** 3 + rng.normal(0, 2, (len(times), 1))
+    # Rare scarcity events lift every zone for one interval
+    spikes = rng.random((len(times), 1)) < 0.002
+    energy = energy + spikes * rng.gamma(2, 60, (len(times), 1))
+    congestion = np.maximum(0, premium * stress ** 2 + rng.normal(0, 1.5, load.shape))
+    lbmp = energy + congestion + rng.normal(0, 1, load.shape)
+
+    stamps = times.strftime(NYISO_FORMAT).to_numpy()
+    pricing = pd.DataFrame({
+        'timestamp': np.repeat(stamps, len(zones)),
+        'zone': np.tile(zones, len(times)),
+        'load_mw': load.ravel().round(1),
+        'lbmp': lbmp.ravel().round(2),
+        'congestion': congestion.ravel().round(2),
+    })
+
+    system = system[:, 0]
+    solar = np.clip(np.sin(np.pi * (hour - 6) / 14), 0, None) * (0.8 + 0.2 * seasonal) * 1800
+    wind = np.clip(900 + np.cumsum(rng.normal(0, 25, len(times))) % 1800 - 450, 50, None)
+    nuclear = np.full(len(times), 3300.0)
+    hydro = 3000 + 300 * np.sin(2 * np.pi * day_of_year / 365)
+    other = np.full(len(times), 400.0)
+    gas = np.maximum(system - nuclear - hydro - wind - solar - other, 500)
+    generation = np.column_stack([nuclear, hydro, wind, solar, gas, other]).round(1)
+    shares = generation / generation.sum(axis=1, keepdims=True) * 100
+
+    fuel_mix = pd.DataFrame({
+        'timestamp': np.repeat(stamps, len(FUELS)),
+        'fuel_type': np.tile(FUELS, len(times)),
+        'generation_mw': generation.ravel(),
+        'percentage': shares.ravel(),
+    })
+    return pricing, fuel_mix
+
+
+def raw_pricing_csv(pricing):
+    """A prepared pricing frame in the column layout of the MIS realtime_zone CSV"""
+    return pd.DataFrame({
+        'Time Stamp': pricing['timestamp'],
+        'Name': pricing['zone'],
+        'PTID': 61750,
+        'LBMP ($/MWHr)': pricing['lbmp'],
+        'Marginal Cost Losses ($/MWHr)': 0.0,
+        'Marginal Cost Congestion ($/MWHr)': pricing['congestion'],
+    })
+
+
+def raw_fuel_mix_csv(fuel_mix):
+    """A prepared fuel mix frame in the column layout of the MIS rtfuelmix CSV"""
+    return pd.DataFrame({
+        'Time Stamp': fuel_mix['timestamp'],
+        'Time Zone': 'EST',
+        'Fuel Category': fuel_mix['fuel_type'],
+        'Gen MW': fuel_mix['generation_mw'],
+    })
+
+
+def write_recordings(directory, start, days, interval_minutes=5, seed=0):
+    """Daily realtime_zone and rtfuelmix CSVs, as replay.py reads them; returns the paths"""
+    os.makedirs(directory, exist_ok=True)
+    pricing, fuel_mix = generate_history(start, days, interval_minutes, seed)
+    paths = []
+    for frame, stem, to_csv in ((pricing, 'realtime_zone', raw_pricing_csv), (fuel_mix, 'rtfuelmix', raw_fuel_mix_csv)):
+        for day, rows in frame.groupby(frame['timestamp'].str[:10], sort=False):
+            path = os.path.join(directory, f'{datetime.strptime(day, "%m/%d/%Y"):%Y%m%d}{stem}.csv')
+            to_csv(rows).to_csv(path, index=False)
+            paths.append(path)
+    return paths
+
+
+def populate(collector, start, days, interval_minutes=5, seed=0, chunk_days=31, log=print):
+    """Write a synthetic history through the collector's ingest path; returns rows written"""
+    written = 0
+    day = 0
+    while day < days:
+        span = min(chunk_days, days - day)
+        pricing, fuel_mix = generate_history(start + timedelta(days=day), span, interval_minutes, seed + day)
+        last = day + span >= days
+        # Only the final chunk refreshes the "latest" snapshots
+        written += collector.write_pricing_frame(pricing, update_latest=last)
+        written += collector.write_fuel_mix_frame(fuel_mix, update_latest=last)
+        day += span
+        log(f"{day}/{days} days, {written} rows")
+    return written
+
+
+def main(argv=None):
+    from collector import NYISOCollector
+    from db import ConnectionManager
+
+    parser = argparse.ArgumentParser(description='Write a synthetic NYISO history into nyiso.db')
+    parser.add_argument('--days', type=int, default=365, help='days of history (default: 365)')
+    parser.add_argument('--start', type=date.fromisoformat, default=None,
+                        help='first day, YYYY-MM-DD (default: ending today)')
+    parser.add_argument('--interval', type=int, default=5, help='minutes between intervals (default: 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', default=None, help='database path (default: NYISO_DB_PATH or nyiso.db)')
+    parser.add_argument('--recordings', default=None,
+                        help='write daily MIS-style CSVs to this directory for replay.py instead of a database')
+    args = parser.parse_args(argv)
+
+    start = args.start or date.today() - timedelta(days=args.days - 1)
+    if args.recordings:
+        paths = write_recordings(args.recordings, datetime.combine(start, datetime.min.time()), args.days,
+                                 args.interval, args.seed)
+        print(f"✅ {len(paths)} files written to {args.recordings}")
+        return
+
+    collector = NYISOCollector(ConnectionManager(args.db))
+    started = time.monotonic()
+    print(f"🧪 Generating {args.days} days of synthetic history from {start}")
+    rows = populate(collector, datetime.combine(start, datetime.min.time()), args.days, args.interval, args.seed)
+    elapsed = time.monotonic() - started
+    print(f"✅ {rows} rows written in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,511 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import json
+import threading
+import time
+import os
+from alerts import AlertEngine
+from analytics import ZoneAnalytics
+from archive import Archive
+from db import ConnectionManager, lease_for
+from fetcher import DEFAULT_BASE_URL, FeedFetcher
+from forecast import LoadForecaster
+from fuelmix import pivot_intervals, shares, write_interval_metrics
+from metrics import COLLECTOR_METRICS, PersistedMetrics
+from refresh import RefreshJobs
+from rollups import apply_rollups, epoch_seconds
+from schema import dictionary_ids, migrate
+from versions import DatasetVersions
+
+def prepare_pricing_frame(df):
+    """Coerce a raw realtime_zone CSV into validated insert-ready columns"""
+    current_time = datetime.now().isoformat()
+    
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+    
+    frame = pd.DataFrame({
+        'timestamp': column('Time Stamp', current_time),
+        'zone': column('Name', 'Unknown'),
+        'lbmp': pd.to_numeric(column('LBMP ($/MWHr)', 0), errors='coerce'),
+        'congestion': pd.to_numeric(column('Marginal Cost Congestion ($/MWHr)', 0), errors='coerce'),
+    })
+    
+    # Rows with a missing key or a non-numeric price are dropped, matching
+    # the old per-row skip on conversion errors
+    frame = frame.dropna()
+    frame['timestamp'] = frame['timestamp'].astype(str).str.strip()
+    frame['zone'] = frame['zone'].astype(str).str.strip()
+    frame = frame.drop_duplicates(subset=['timestamp', 'zone'], keep='last')
+    
+    # Simulate load data
+    n = len(frame)
+    is_nyc = (frame['zone'] == 'N.Y.C.').to_numpy()
+    frame.insert(2, 'load_mw', np.where(is_nyc,
+                                        np.random.normal(8000, 800, n),
+                                        np.random.normal(2000, 300, n)))
+    return frame
+
+def prepare_fuel_mix_frame(df):
+    """Coerce a raw rtfuelmix CSV into per-interval generation and shares"""
+    if not {'Time Stamp', 'Fuel Category', 'Gen MW'} <= set(df.columns):
+        return pd.DataFrame(columns=['timestamp', 'fuel_type', 'generation_mw', 'percentage'])
+    
+    frame = pd.DataFrame({
+        'timestamp': df.get('Time Stamp'),
+        'fuel_type': df.get('Fuel Category'),
+        'generation_mw': pd.to_numeric(df.get('Gen MW'), errors='coerce'),
+    }).dropna()
+    frame['timestamp'] = frame['timestamp'].astype(str).str.strip()
+    frame['fuel_type'] = frame['fuel_type'].astype(str).str.strip()
+    frame = frame.drop_duplicates(subset=['timestamp', 'fuel_type'], keep='last')
+    
+    total = frame.groupby('timestamp')['generation_mw'].transform('sum')
+    frame['percentage'] = (frame['generation_mw'] / total.where(total > 0) * 100).fillna(0.0)
+    return frame
+
+def with_epoch(frame, key):
+    """A prepared frame plus its interval in ts, keeping the last row per (key, ts)"""
+    frame = frame.assign(ts=epoch_seconds(frame['timestamp']))
+    frame = frame[frame['ts'].notna()].astype({'ts': 'int64'})
+    return frame.drop_duplicates(subset=[key, 'ts'], keep='last')
+
+class NYISOCollector:
+    def __init__(self, db, base_url=None, versions=None):
+        base_url = base_url or os.environ.get('NYISO_MIS_BASE_URL', DEFAULT_BASE_URL)
+        self.base_urls = {
+            'realtime_lbmp': base_url + '/realtime/{date}realtime_zone.csv',
+            'fuel_mix': base_url + '/rtfuelmix/{date}rtfuelmix.csv'
+        }
+        self.fetcher = FeedFetcher(self.base_urls)
+        self.db = db
+        self.forecaster = LoadForecaster(db)
+        self.archive = Archive(db)
+        self.alert_engine = AlertEngine()
+        self.analytics = ZoneAnalytics()
+        self.stats = PersistedMetrics(COLLECTOR_METRICS)
+        self._cycle_ok = True
+        migrate(self.db)
+        self.is_collecting = False
+        # Shared with the web application when it built this collector
+        self.versions = versions or DatasetVersions(db)
+    
+    @property
+    def data_version(self):
+        return self.versions.data_version
+    
+    @property
+    def listeners(self):
+        return self.versions.listeners
+    
+    def bump_version(self, *datasets):
+        self.versions.bump(*datasets)
+    
+    def notify_listeners(self):
+        self.versions.notify_listeners()
+    
+    def fetch_and_process_data(self):
+        """Run one collection cycle; True when it finished without errors"""
+        started = time.monotonic()
+        self._cycle_ok = True
+        try:
+            self._collect()
+        finally:
+            self.refresh_forecasts()
+            self.record_cycle(time.monotonic() - started)
+            self.notify_listeners()
+        return self._cycle_ok
+    
+    def record_failure(self, stage):
+        self._cycle_ok = False
+        self.stats.inc('nyiso_collector_errors_total', stage=stage)
+    
+    def record_fetch(self, result):
+        self.stats.inc('nyiso_collector_fetches_total', feed=result.feed, status=result.status)
+        self.stats.inc('nyiso_collector_fetch_bytes_total', result.bytes, feed=result.feed)
+    
+    def record_cycle(self, elapsed):
+        now = time.time()
+        self.stats.inc('nyiso_collector_cycles_total', result='success' if self._cycle_ok else 'error')
+        self.stats.inc('nyiso_collector_cycle_seconds_total', elapsed)
+        self.stats.set('nyiso_collector_last_cycle_seconds', elapsed)
+        self.stats.set('nyiso_collector_last_cycle_timestamp_seconds', now)
+        if self._cycle_ok:
+            self.stats.set('nyiso_collector_last_success_timestamp_seconds', now)
+        try:
+            with self.db.writer() as conn:
+                self.stats.flush(conn)
+        except Exception as e:
+            print(f"Metrics error: {e}")
+    
+    def refresh_forecasts(self, force=False):
+        """Re-predict every zone when new load data (or a new model) has arrived"""
+        if not force and 'realtime' not in self.versions.pending():
+            return
+        
+        try:
+            with self.db.reader() as conn:
+                rows = self.forecaster.predict_all(conn)
+            if not rows:
+                return
+            
+            with self.db.writer() as conn:
+                conn.execute('DELETE FROM load_forecasts')
+                conn.executemany('''
+                    INSERT INTO load_forecasts
+                    (zone, horizon_hours, target_time, load_mw, confidence, model_version, generated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            self.bump_version('forecast')
+        except Exception as e:
+            print(f"Forecast error: {e}")
+    
+    def _collect(self):
+        try:
+            # All feeds are fetched concurrently and only return new rows
+            fetches = self.fetcher.fetch_all(datetime.now())
+            
+            try:
+                pricing = fetches['realtime_lbmp'].result()
+                self.record_fetch(pricing)
+                if pricing.frame is not None:
+                    self.process_pricing_data(pricing.frame)
+                # Only once written, so a failed write is fetched again
+                self.fetcher.commit(pricing.feed)
+            except Exception:
+                # If real data fails, use sample data
+                self.record_failure('realtime_lbmp')
+                self.generate_sample_data()
+            
+            try:
+                fuel_mix = fetches['fuel_mix'].result()
+                self.record_fetch(fuel_mix)
+                if fuel_mix.frame is not None:
+                    self.process_fuel_mix_data(fuel_mix.frame)
+                self.fetcher.commit(fuel_mix.feed)
+            except Exception as e:
+                self.record_failure('fuel_mix')
+                print(f"Fuel mix collection error: {e}")
+            
+            return True
+            
+        except Exception as e:
+            self.record_failure('collect')
+            print(f"Error in data collection: {e}")
+            # Generate sample data as fallback
+            self.generate_sample_data()
+            return True
+    
+    def generate_sample_data(self):
+        """Generate sample data for demonstration"""
+        pricing, fuel_mix = self._sample_frames()
+        self.write_pricing_frame(pricing)
+        self.write_fuel_mix_frame(fuel_mix)
+    
+    def _sample_frames(self):
+        current_time = datetime.now().isoformat()
+        
+        zones = ['CAPITL', 'CENTRL', 'DUNWOD', 'GENESE', 'HUD VL', 'LONGIL', 'MHK VL', 'MILLWD', 'N.Y.C.', 'NORTH', 'WEST']
+        samples = []
+        
+        for zone in zones:
+            # Simulate realistic NYISO data
+            if zone == 'N.Y.C.':
+                load = np.random.normal(8000, 800)  # NYC has higher load
+                price = np.random.normal(45, 15)
+            else:
+                load = np.random.normal(2000, 300)
+                price = np.random.normal(35, 10)
+                
+            congestion = max(0, np.random.normal(5, 10))
+            samples.append((current_time, zone, load, price, congestion))
+        
+        pricing = pd.DataFrame(samples, columns=['timestamp', 'zone', 'load_mw', 'lbmp', 'congestion'])
+        
+        # Sample fuel mix data
+        fuel_types = [
+            ('Natural Gas', 45.0),
+            ('Nuclear', 25.0),
+            ('Hydro', 15.0),
+            ('Wind', 8.0),
+            ('Solar', 4.0),
+            ('Other', 3.0)
+        ]
+        
+        fuel_mix = []
+        for fuel, base_pct in fuel_types:
+            # Add some variation
+            percentage = base_pct + np.random.normal(0, 2)
+            generation = percentage * 100  # Simulated MW
+            fuel_mix.append((current_time, fuel, generation, percentage))
+        
+        fuel_mix = pd.DataFrame(fuel_mix, columns=['timestamp', 'fuel_type', 'generation_mw', 'percentage'])
+        return pricing, fuel_mix
+    
+    def process_pricing_data(self, df, update_latest=True):
+        if df.empty:
+            return 0
+        return self.write_pricing_frame(prepare_pricing_frame(df), update_latest)
+    
+    def write_pricing_frame(self, frame, update_latest=True):
+        """Upsert a prepared pricing frame in one transaction"""
+        frame = with_epoch(frame, 'zone')
+        if frame.empty:
+            return 0
+        
+        # One write time per batch: epoch seconds in the history table, the
+        # CURRENT_TIMESTAMP format in the latest snapshot
+        created_at = int(time.time())
+        batch_time = datetime.utcfromtimestamp(created_at).strftime('%Y-%m-%d %H:%M:%S')
+        
+        with self.db.writer() as conn:
+            # Unchanged intervals are left alone and only new or revised ones
+            # are written; revisions keep the load already stored
+            changes = self.changed_pricing_rows(conn, frame)
+            zone_ids = dictionary_ids(conn, 'zones', changes['zone'].unique().tolist())
+            rows = zip(changes['zone'].map(zone_ids).tolist(), changes['ts'].tolist(),
+                       *(changes[column].tolist() for column in ('load_mw', 'lbmp', 'congestion')))
+            
+            cursor = conn.executemany('''
+                INSERT INTO realtime_data 
+                (zone_id, ts, load_mw, lbmp, congestion, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (zone_id, ts) DO UPDATE SET
+                    lbmp = excluded.lbmp,
+                    congestion = excluded.congestion
+                WHERE lbmp IS NOT excluded.lbmp OR congestion IS NOT excluded.congestion
+            ''', [row + (created_at,) for row in rows])
+            written = cursor.rowcount
+            apply_rollups(conn, changes)
+            
+            if update_latest:
+                latest = self.latest_per_zone(frame)
+                columns = ['timestamp', 'zone', 'load_mw', 'lbmp', 'congestion']
+                conn.executemany('''
+                    INSERT OR REPLACE INTO realtime_latest
+                    (timestamp, zone, load_mw, lbmp, congestion, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [row + (batch_time,) for row in latest[columns].itertuples(index=False, name=None)])
+        
+        self.stats.inc('nyiso_collector_rows_ingested_total', written, dataset='realtime')
+        self.stats.inc('nyiso_collector_rows_skipped_total', len(frame) - len(changes), dataset='realtime')
+        if written:
+            self.bump_version('realtime')
+        if update_latest:
+            # Live batches only; revisions were already seen when first ingested
+            self.check_alerts(changes[changes['old_lbmp'].isna()])
+            self.update_analytics(changes[changes['old_lbmp'].isna()])
+        return written
+    
+    def changed_pricing_rows(self, conn, frame):
+        """Rows of frame that are new or revise a stored interval, with old_* values"""
+        intervals = frame['ts'].unique().tolist()
+        stored = []
+        for i in range(0, len(intervals), 500):
+            chunk = intervals[i:i + 500]
+            stored += conn.execute(f'''
+                SELECT ts, zone, load_mw, lbmp, congestion FROM realtime_rows
+                WHERE ts IN ({', '.join('?' * len(chunk))})
+            ''', chunk).fetchall()
+        
+        stored = pd.DataFrame(stored, columns=['ts', 'zone', 'old_load_mw', 'old_lbmp', 'old_congestion'])
+        
+        # Intervals of days already moved to the archive are looked up there
+        days = pd.to_datetime(pd.Series(intervals, dtype='int64'), unit='s').dt.date.unique()
+        archived = self.archive.read_cold(conn, 'realtime_data', None, None, days=days)
+        if not archived.empty:
+            archived = archived.assign(ts=epoch_seconds(archived['ts']))
+            archived = archived[archived['ts'].isin(intervals)]
+            archived = archived[['ts', 'zone', 'load_mw', 'lbmp', 'congestion']].set_axis(stored.columns, axis=1)
+            stored = pd.concat([archived, stored]).drop_duplicates(subset=['ts', 'zone'], keep='last')
+        # An empty lookup gives object columns, which would push the merge and
+        # the rollup groupbys onto pandas' slow pure-Python paths
+        stored = stored.astype({'ts': 'int64', 'old_load_mw': 'float64', 'old_lbmp': 'float64',
+                                'old_congestion': 'float64'})
+        frame = frame.astype({'load_mw': 'float64', 'lbmp': 'float64', 'congestion': 'float64'})
+        merged = frame.merge(stored, on=['ts', 'zone'], how='left')
+        is_new = merged['old_lbmp'].isna()
+        revised = ~is_new & ((merged['lbmp'] != merged['old_lbmp']) |
+                             (merged['congestion'] != merged['old_congestion']))
+        merged.loc[revised, 'load_mw'] = merged.loc[revised, 'old_load_mw']
+        return merged[is_new | revised]
+    
+    def latest_per_zone(self, frame):
+        """Most recent interval for each zone in a frame from with_epoch"""
+        return frame.sort_values('ts', kind='stable').groupby('zone', sort=False).tail(1)
+    
+    def process_fuel_mix_data(self, df, update_latest=True):
+        if df.empty:
+            return 0
+        return self.write_fuel_mix_frame(prepare_fuel_mix_frame(df), update_latest)
+    
+    def write_fuel_mix_frame(self, frame, update_latest=True):
+        """Upsert a prepared fuel mix frame and its interval metrics in one transaction"""
+        frame = with_epoch(frame, 'fuel_type')
+        if frame.empty:
+            return 0
+        
+        created_at = int(time.time())
+        batch_time = datetime.utcfromtimestamp(created_at).strftime('%Y-%m-%d %H:%M:%S')
+        
+        incoming = len(frame)
+        with self.db.writer() as conn:
+            # A fetch can end part way through an interval, so its shares and
+            # metrics are worked out over the stored rows plus the new ones
+            frame = self.complete_fuel_mix_intervals(conn, frame)
+            wide = pivot_intervals(frame)
+            frame['percentage'] = shares(wide).stack().reindex(
+                pd.MultiIndex.from_frame(frame[['ts', 'fuel_type']])).to_numpy()
+            
+            fuel_ids = dictionary_ids(conn, 'fuels', frame['fuel_type'].unique().tolist())
+            rows = zip(frame['fuel_type'].map(fuel_ids).tolist(), frame['ts'].tolist(),
+                       frame['generation_mw'].tolist(), frame['percentage'].tolist())
+            cursor = conn.executemany('''
+                INSERT INTO fuel_mix_data
+                (fuel_id, ts, generation_mw, percentage, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (fuel_id, ts) DO UPDATE SET
+                    generation_mw = excluded.generation_mw,
+                    percentage = excluded.percentage
+                WHERE generation_mw IS NOT excluded.generation_mw OR percentage IS NOT excluded.percentage
+            ''', [row + (created_at,) for row in rows])
+            written = cursor.rowcount
+            write_interval_metrics(conn, wide, created_at)
+            
+            if update_latest:
+                latest = self.latest_interval(frame).sort_values('percentage', ascending=False, kind='stable')
+                columns = ['timestamp', 'fuel_type', 'generation_mw', 'percentage']
+                conn.execute('DELETE FROM fuel_mix_latest')
+                conn.executemany('''
+                    INSERT INTO fuel_mix_latest
+                    (timestamp, fuel_type, generation_mw, percentage, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [row + (batch_time,) for row in latest[columns].itertuples(index=False, name=None)])
+        
+        self.stats.inc('nyiso_collector_rows_ingested_total', written, dataset='fuel_mix')
+        self.stats.inc('nyiso_collector_rows_skipped_total', max(incoming - written, 0), dataset='fuel_mix')
+        if written:
+            self.bump_version('fuel_mix')
+        return written
+    
+    def complete_fuel_mix_intervals(self, conn, frame):
+        """frame plus the stored rows of its intervals for fuels it does not carry"""
+        intervals = frame['ts'].unique().tolist()
+        stored = []
+        for i in range(0, len(intervals), 500):
+            chunk = intervals[i:i + 500]
+            stored += conn.execute(f'''
+                SELECT timestamp, fuel_type, generation_mw, ts FROM fuel_mix_rows
+                WHERE ts IN ({', '.join('?' * len(chunk))})
+            ''', chunk).fetchall()
+        if not stored:
+            return frame[['timestamp', 'fuel_type', 'generation_mw', 'ts']].copy()
+        
+        stored = pd.DataFrame(stored, columns=['timestamp', 'fuel_type', 'generation_mw', 'ts'])
+        frame = pd.concat([stored, frame[stored.columns]], ignore_index=True)
+        frame = frame.drop_duplicates(subset=['ts', 'fuel_type'], keep='last').reset_index(drop=True)
+        # Stored rows take the new rows' stamp, which the latest snapshot shows
+        frame['timestamp'] = frame.groupby('ts')['timestamp'].transform('last')
+        return frame
+    
+    def latest_interval(self, frame):
+        """Rows of the most recent interval in a frame from with_epoch"""
+        return frame[frame['ts'] == frame['ts'].max()]
+    
+    def update_analytics(self, batch):
+        """Fold the rows just ingested into the cross-zone statistics and store their summaries"""
+        try:
+            through = self.analytics.through_ts
+            if not self.analytics.ready:
+                with self.db.reader() as conn:
+                    self.analytics.warm_up(conn)
+            self.analytics.ingest(batch[['ts', 'zone', 'lbmp', 'congestion']])
+            if self.analytics.through_ts == through:
+                return
+            
+            rows = [(name, self.analytics.through_ts, json.dumps(summary, separators=(',', ':')))
+                    for name, summary in self.analytics.summaries().items()]
+            with self.db.writer() as conn:
+                # Windows dropped from the configuration go too
+                conn.execute('DELETE FROM zone_analytics')
+                conn.executemany('INSERT INTO zone_analytics (window_name, through_ts, payload) VALUES (?, ?, ?)',
+                                 rows)
+            self.bump_version('analytics')
+        except Exception as e:
+            print(f"Analytics error: {e}")
+    
+    def check_alerts(self, batch):
+        """Run the alert rules over the rows just ingested"""
+        if not self.alert_engine.ready:
+            with self.db.reader() as conn:
+                self.alert_engine.warm_up(conn)
+        
+        alerts = self.alert_engine.evaluate(batch)
+        if not alerts:
+            return
+        
+        with self.db.writer() as conn:
+            cursor = conn.executemany('''
+                INSERT OR IGNORE INTO alerts_log (timestamp, alert_type, zone, message, value)
+                VALUES (?, ?, ?, ?, ?)
+            ''', alerts)
+        
+        if cursor.rowcount:
+            self.bump_version('alerts')
+
+def train_forever(collector, retrain_interval=None, check_interval=600):
+    # Retrains in the background whenever the current model is missing or old
+    retrain_interval = retrain_interval or int(os.environ.get('NYISO_FORECAST_RETRAIN_HOURS', '6')) * 3600
+    while True:
+        try:
+            age = collector.forecaster.artifact_age()
+            if age is None or age > retrain_interval:
+                if collector.forecaster.train() is not None:
+                    collector.refresh_forecasts(force=True)
+        except Exception as e:
+            print(f"Forecast training error: {e}")
+        time.sleep(check_interval)
+
+def archive_forever(collector, check_interval=3600):
+    # Moves days past the retention window to the archive as they close
+    retention_days = int(os.environ.get('NYISO_RETENTION_DAYS', '30'))
+    while True:
+        try:
+            collector.archive.archive_closed_days(retention_days)
+        except Exception as e:
+            print(f"Archive error: {e}")
+        time.sleep(check_interval)
+
+def collect_forever(collector, interval=300):
+    collector.is_collecting = True
+    threading.Thread(target=train_forever, args=(collector,), daemon=True).start()
+    threading.Thread(target=archive_forever, args=(collector,), daemon=True).start()
+    # Manual refreshes queued by the web workers run here, as an early cycle
+    refresh_jobs = RefreshJobs(collector.db)
+    while True:
+        jobs = []
+        try:
+            jobs = refresh_jobs.claim()
+            ok = collector.fetch_and_process_data()
+            refresh_jobs.finish(jobs, ok)
+            refresh_jobs.wait(interval)  # 5 minutes, or until a refresh is requested
+        except Exception as e:
+            print(f"Background collection error: {e}")
+            try:
+                refresh_jobs.finish(jobs, False, str(e))
+            except Exception:
+                pass
+            time.sleep(60)
+
+if __name__ == '__main__':
+    # Standalone collector; run web workers with NYISO_COLLECTOR=off alongside
+    db = ConnectionManager()
+    collector = NYISOCollector(db)
+    lease = lease_for(db)
+    
+    if not lease.acquire(blocking=False):
+        print("🔒 Another process holds the collector lease, waiting...")
+        lease.acquire()
+    print("🔄 Collecting NYISO data...")
+    collect_forever(collector)
@@ -0,0 +1,146 @@
+import fcntl
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from metrics import TimedConnection
+
+
+class ConnectionManager:
+    """SQLite access split into one writer connection and a pool of readers.
+
+    The database runs in WAL mode, so readers see the last committed state
+    and never wait on the collector's write transaction. Writes are
+    serialized through a single connection guarded by a lock.
+    """
+
+    def __init__(self, path=None, pool_size=None, synchronous=None, cache_size=None, mmap_size=None):
+        self.path = path or os.environ.get('NYISO_DB_PATH', 'nyiso.db')
+        self.pool_size = pool_size or int(os.environ.get('NYISO_DB_READERS', 8))
+        self.pragmas = {
+            'synchronous': synchronous or os.environ.get('NYISO_DB_SYNCHRONOUS', 'NORMAL'),
+            # Negative values are KiB rather than pages
+            'cache_size': cache_size or int(os.environ.get('NYISO_DB_CACHE_SIZE', -20000)),
+            'mmap_size': mmap_size or int(os.environ.get('NYISO_DB_MMAP_SIZE', 256 * 1024 * 1024)),
+        }
+
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+
+    def _configure(self, connection):
+        connection.execute('PRAGMA busy_timeout = 30000')
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _writer_connection(self):
+        if self._writer is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30,
+                                         factory=TimedConnection)
+            connection.execute('PRAGMA journal_mode = WAL')
+            self._writer = self._configure(connection)
+        return self._writer
+
+    def _open_reader(self):
+        connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True,
+                                     check_same_thread=False, timeout=30, factory=TimedConnection)
+        return self._configure(connection)
+
+    @contextmanager
+    def writer(self):
+        """The writer connection, held exclusively; commits on success"""
+        with self._write_lock:
+            connection = self._writer_connection()
+            with connection:
+                yield connection
+
+    @contextmanager
+    def reader(self):
+        """A read-only connection borrowed from the pool"""
+        try:
+            connection = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._reader_count < self.pool_size
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                try:
+                    connection = self._open_reader()
+                except Exception:
+                    with self._pool_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                connection = self._readers.get()
+
+        try:
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            self._readers.put(connection)
+
+    @contextmanager
+    def streaming_reader(self):
+        """A read-only connection of its own, outside the pool.
+
+        For reads held open while a slow client consumes them, which would
+        otherwise keep a pooled reader from every other request.
+        """
+        connection = self._open_reader()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._pool_lock:
+                self._reader_count -= 1
+
+
+class CollectorLease:
+    """Exclusive lock file that lets only one process collect into a database"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking=True):
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def lease_for(db):
+    return CollectorLease(f'{db.path}.collector.lock')
@@ -0,0 +1,163 @@
+"""Bulk export of the history tables as CSV, NDJSON or Parquet.
+
+Rows are read with fetchmany and encoded one chunk at a time, so an export
+of any range holds at most EXPORT_CHUNK_ROWS rows in memory. The read stays
+open while the client downloads, on a connection outside the reader pool,
+so slow downloads never starve the dashboard of readers. Archived days
+are read back one partition at a time, merged with any rows SQLite still
+holds for them, in order with the days that were never archived.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from rollups import epoch_of
+from schema import ROW_VIEWS
+
+EXPORT_CHUNK_ROWS = 10000
+
+# Dataset -> (table, name column, value columns)
+EXPORT_DATASETS = {
+    'realtime': ('realtime_data', 'zone', ['load_mw', 'lbmp', 'congestion']),
+    'fuel_mix': ('fuel_mix_data', 'fuel_type', ['generation_mw', 'percentage']),
+}
+
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+def export_columns(dataset):
+    _, name_column, values = EXPORT_DATASETS[dataset]
+    return ['timestamp', name_column] + values
+
+
+def export_chunks(db, archive, dataset, start, end, names=None):
+    """Lists of at most EXPORT_CHUNK_ROWS rows within [start, end), oldest first.
+
+    archive is called for the Archive only when the range reaches archived
+    days. Those are read one at a time with Archive.read_range, so a revision
+    written to SQLite after archiving replaces the archived row; the days in
+    between stream straight from SQLite.
+    """
+    table, name_column, _ = EXPORT_DATASETS[dataset]
+    with db.reader() as conn:
+        archived = [datetime.strptime(day, '%Y-%m-%d') for day, in conn.execute('''
+            SELECT day FROM archive_partitions WHERE table_name = ? AND day >= ? AND day < ? ORDER BY day
+        ''', (table, start.date().isoformat(), end.isoformat()))]
+
+    cursor = start
+    for day in archived:
+        day_start, day_end = max(day, start), min(day + timedelta(days=1), end)
+        if day_start >= day_end:
+            continue
+        yield from _hot_chunks(db, dataset, cursor, day_start, names)
+        yield from _archived_chunks(db, archive, dataset, day_start, day_end, names)
+        cursor = day_end
+    yield from _hot_chunks(db, dataset, cursor, end, names)
+
+
+def _archived_chunks(db, archive, dataset, start, end, names):
+    table, name_column, _ = EXPORT_DATASETS[dataset]
+    with db.reader() as conn:
+        frame = archive().read_range(conn, table, start, end, names)
+    if names:
+        frame = frame[frame[name_column].isin(names)]
+    frame = frame.sort_values(['ts', name_column], kind='stable')
+    frame = frame.assign(timestamp=frame['ts'].dt.strftime(TIME_FORMAT))[export_columns(dataset)]
+    for i in range(0, len(frame), EXPORT_CHUNK_ROWS):
+        yield list(frame.iloc[i:i + EXPORT_CHUNK_ROWS].itertuples(index=False, name=None))
+
+
+def _hot_chunks(db, dataset, start, end, names):
+    if start >= end:
+        return
+    table, name_column, values = EXPORT_DATASETS[dataset]
+    where, params = 'ts >= ? AND ts < ?', [epoch_of(start), epoch_of(end)]
+    if names:
+        where += f" AND {name_column} IN ({', '.join('?' * len(names))})"
+        params += names
+    # One read transaction per stretch of days, so each is a consistent
+    # snapshot; held across yields, so not on a pooled reader
+    with db.streaming_reader() as conn:
+        cursor = conn.execute(f'''
+            SELECT strftime('{TIME_FORMAT}', ts, 'unixepoch'), {name_column}, {', '.join(values)}
+            FROM {ROW_VIEWS[table]}
+            WHERE {where}
+            ORDER BY ts, {name_column}
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield rows
+
+
+def encode_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(columns, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n'
+                      for row in rows).encode()
+
+
+class _Drain:
+    """Write-only file whose contents are handed out and discarded as they arrive"""
+
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def encode_parquet(columns, chunks):
+    # One row group per chunk, written out as soon as it is complete
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in columns[:2]]
+                       + [(column, pa.float64()) for column in columns[2:]])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+# Format -> (mimetype, encoder)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', encode_csv),
+    'ndjson': ('application/x-ndjson', encode_ndjson),
+    'parquet': ('application/vnd.apache.parquet', encode_parquet),
+}
@@ -0,0 +1,155 @@
+import copy
+import hashlib
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'http://mis.nyiso.com/public/csv'
+
+# Outcome of one feed fetch: frame holds only rows not seen before
+FetchResult = namedtuple('FetchResult', ['feed', 'url', 'status', 'frame', 'bytes'])
+
+
+class FeedState:
+    """What has already been consumed from one day's file"""
+
+    def __init__(self, url):
+        self.url = url
+        self.etag = None
+        self.last_modified = None
+        self.header = b''
+        # Bytes up to and including the last complete line parsed
+        self.offset = 0
+        # Of the bytes before offset, to tell an appended file from a rewritten one
+        self.digest = hashlib.sha1()
+
+    def advanced(self):
+        state = copy.copy(self)
+        state.digest = self.digest.copy()
+        return state
+
+
+class FeedFetcher:
+    """Incremental, conditional fetching of the daily NYISO MIS CSV files.
+
+    The MIS files for the current day only ever grow by appending new
+    intervals, so each feed remembers how far it has read and asks for the
+    rest with a byte range, guarded by If-Range so a changed file comes back
+    whole. Servers that ignore Range get the consumed prefix skipped locally
+    instead, and a file whose prefix no longer matches is parsed from the
+    start. ETag / Last-Modified validators turn polls of an unchanged file
+    into a 304 with no body.
+
+    How far a feed has read only moves when the caller commits it after
+    writing the rows, so a failed write is fetched again on the next poll.
+    """
+
+    def __init__(self, url_templates, session=None, timeout=10):
+        self.url_templates = url_templates
+        self.timeout = timeout
+        self.session = session or self._pooled_session(len(url_templates))
+        self._executor = ThreadPoolExecutor(max_workers=len(url_templates), thread_name_prefix='feed')
+        self._state = {}
+        # Feed -> state after its last fetch, waiting for commit
+        self._pending = {}
+
+    def _pooled_session(self, size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch_all(self, date):
+        """Fetch every configured feed concurrently; returns feed -> future"""
+        return {feed: self._executor.submit(self.fetch, feed, date) for feed in self.url_templates}
+
+    def commit(self, feed):
+        """Mark the rows of the feed's last fetch as written"""
+        state = self._pending.pop(feed, None)
+        if state is not None:
+            self._state[feed] = state
+
+    def fetch(self, feed, date):
+        url = self.url_templates[feed].format(date=date.strftime('%Y%m%d'))
+        self._pending.pop(feed, None)
+        committed = self._state.get(feed)
+        if committed is None or committed.url != url:
+            # A new day starts a new file
+            committed = FeedState(url)
+
+        headers = {}
+        if committed.etag:
+            headers['If-None-Match'] = committed.etag
+        if committed.last_modified:
+            headers['If-Modified-Since'] = committed.last_modified
+        if committed.offset:
+            headers['Range'] = f'bytes={committed.offset}-'
+            validator = committed.etag or committed.last_modified
+            if validator:
+                headers['If-Range'] = validator
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        received = len(response.content)
+
+        # 304 / 416: unchanged, or nothing past the consumed offset. Anything
+        # else is not published yet or an upstream error; connection failures
+        # raise
+        if response.status_code not in (200, 206):
+            return FetchResult(feed, url, response.status_code, None, received)
+
+        state = committed.advanced()
+        body = response.content
+        start = 0
+        if response.status_code == 206:
+            start = self._range_start(response)
+            if start != state.offset:
+                # Not the range we asked for; start the file over
+                return self._restart(feed, date)
+        elif state.offset:
+            if len(body) < state.offset or hashlib.sha1(body[:state.offset]).digest() != state.digest.digest():
+                # The file was replaced or revised rather than appended to:
+                # parse all of it, the upserts skip rows already stored
+                state = FeedState(url)
+            else:
+                body = body[state.offset:]
+                start = state.offset
+
+        if start == 0:
+            header_end = body.find(b'\n') + 1
+            if header_end == 0:
+                return FetchResult(feed, url, response.status_code, None, received)
+            state.header = body[:header_end]
+            state.digest.update(state.header)
+            body = body[header_end:]
+            start = header_end
+
+        # A trailing partial line is left for the next poll
+        complete = body[:body.rfind(b'\n') + 1]
+        state.offset = start + len(complete)
+        state.digest.update(complete)
+        state.etag = response.headers.get('ETag')
+        state.last_modified = response.headers.get('Last-Modified')
+        self._pending[feed] = state
+
+        frame = None
+        if complete.strip():
+            frame = pd.read_csv(BytesIO(state.header + complete))
+        return FetchResult(feed, url, response.status_code, frame, received)
+
+    def _range_start(self, response):
+        match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else -1
+
+    def _restart(self, feed, date):
+        self._state.pop(feed, None)
+        return self.fetch(feed, date)
+
+    def reset(self):
+        self._state.clear()
+        self._pending.clear()
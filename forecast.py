@@ -0,0 +1,212 @@
+"""Per-zone load forecasting.
+
+Models are trained off the request path, either by the collector's trainer
+thread or offline with
+
+    python forecast.py train
+
+and saved as versioned joblib artifacts. The collector loads the current
+artifact once, predicts every zone and horizon in one batch after each
+cycle, and stores the results in load_forecasts for the API to serve.
+"""
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Hours ahead predicted by each zone's multi-output model
+HORIZONS = (1, 6, 24)
+# Hourly lags of load used as features
+LAGS = (1, 2, 3, 24, 168)
+FEATURES = [f'lag_{lag}' for lag in LAGS] + ['mean_24', 'hour', 'dayofweek', 'month', 'weekend']
+# Bumped whenever FEATURES changes so older artifacts are not reused
+FEATURE_VERSION = 1
+
+TRAINING_DAYS = 90
+MIN_TRAINING_ROWS = 100
+ARTIFACTS_KEPT = 3
+
+
+def load_hourly(conn, hours):
+    """The most recent hours of average load, one column per zone, on a gap-free hourly index"""
+    latest, = conn.execute('SELECT MAX(bucket) FROM realtime_rollup_hourly').fetchone()
+    if latest is None:
+        return pd.DataFrame()
+    since = datetime.fromisoformat(latest) - timedelta(hours=hours)
+    rows = conn.execute('''
+        SELECT bucket, zone, load_sum / samples FROM realtime_rollup_hourly
+        WHERE bucket > ?
+    ''', (since.strftime('%Y-%m-%d %H:%M:%S'),)).fetchall()
+
+    hourly = pd.DataFrame(rows, columns=['bucket', 'zone', 'load'])
+    wide = hourly.pivot(index='bucket', columns='zone', values='load')
+    wide.index = pd.to_datetime(wide.index)
+    return wide.reindex(pd.date_range(wide.index.min(), wide.index.max(), freq='H'))
+
+
+def build_features(wide):
+    """Lag, rolling and calendar features for every (hour, zone) at once.
+
+    Row t describes the load up to and including hour t; target_<h> is the
+    load of hour t + h.
+    """
+    columns = {f'lag_{lag}': wide.shift(lag - 1) for lag in LAGS}
+    columns['mean_24'] = wide.rolling(24, min_periods=12).mean()
+    for horizon in HORIZONS:
+        columns[f'target_{horizon}'] = wide.shift(-horizon)
+
+    features = pd.concat({name: frame.stack(dropna=False) for name, frame in columns.items()}, axis=1)
+    features.index.names = ['time', 'zone']
+    times = features.index.get_level_values('time')
+    features['hour'] = times.hour
+    features['dayofweek'] = times.dayofweek
+    features['month'] = times.month
+    features['weekend'] = (times.dayofweek >= 5).astype(int)
+    return features
+
+
+class LoadForecaster:
+    """Trains, stores and applies the per-zone load models"""
+
+    def __init__(self, db, model_dir=None):
+        self.db = db
+        self.model_dir = model_dir or os.environ.get('NYISO_MODEL_DIR', 'models')
+        self.pointer_path = os.path.join(self.model_dir, 'load_forecast.json')
+        self._artifact = None
+        self._pointer_mtime = None
+        self._lock = threading.Lock()
+
+    def train(self, now=None):
+        """Fit one model per zone and publish it as a new artifact version"""
+        from sklearn.ensemble import RandomForestRegressor
+
+        now = now or datetime.now()
+        with self.db.reader() as conn:
+            wide = load_hourly(conn, TRAINING_DAYS * 24)
+        if wide.empty:
+            return None
+
+        features = build_features(wide)
+        targets = [f'target_{horizon}' for horizon in HORIZONS]
+        training = features.dropna(subset=FEATURES + targets)
+
+        models, metrics = {}, {}
+        for zone, rows in training.groupby(level='zone'):
+            if len(rows) < MIN_TRAINING_ROWS:
+                continue
+
+            # Chronological holdout for the confidence score, then refit on everything
+            split = int(len(rows) * 0.8)
+            X, y = rows[FEATURES].to_numpy(), rows[targets].to_numpy()
+            model = RandomForestRegressor(n_estimators=30, max_depth=12, min_samples_leaf=10, random_state=0)
+            model.fit(X[:split], y[:split])
+            error = np.abs(model.predict(X[split:]) - y[split:]) / np.maximum(np.abs(y[split:]), 1e-9)
+            metrics[zone] = dict(zip(HORIZONS, np.clip(1 - error.mean(axis=0), 0, 1).round(4).tolist()))
+
+            models[zone] = model.fit(X, y)
+
+        if not models:
+            return None
+
+        version = now.strftime('%Y%m%d%H%M%S')
+        artifact = {
+            'version': version,
+            'trained_at': now.isoformat(),
+            'feature_version': FEATURE_VERSION,
+            'features': FEATURES,
+            'horizons': HORIZONS,
+            'models': models,
+            'confidence': metrics,
+            'rows': len(training),
+        }
+        self._publish(artifact)
+        return version
+
+    def _publish(self, artifact):
+        os.makedirs(self.model_dir, exist_ok=True)
+        filename = f"load_forecast-{artifact['version']}.joblib"
+        path = os.path.join(self.model_dir, filename)
+        joblib.dump(artifact, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+        pointer = {'version': artifact['version'], 'path': filename, 'trained_at': artifact['trained_at']}
+        with open(self.pointer_path + '.tmp', 'w') as f:
+            json.dump(pointer, f)
+        os.replace(self.pointer_path + '.tmp', self.pointer_path)
+
+        with self._lock:
+            self._artifact = artifact
+            self._pointer_mtime = os.path.getmtime(self.pointer_path)
+
+        # Older versions beyond the last few are dropped
+        artifacts = sorted(name for name in os.listdir(self.model_dir)
+                           if name.startswith('load_forecast-') and name.endswith('.joblib'))
+        for name in artifacts[:-ARTIFACTS_KEPT]:
+            os.remove(os.path.join(self.model_dir, name))
+
+    def model(self):
+        """The current artifact, loaded once and reloaded only when a new version is published"""
+        try:
+            mtime = os.path.getmtime(self.pointer_path)
+        except OSError:
+            return self._artifact
+
+        with self._lock:
+            if mtime != self._pointer_mtime:
+                with open(self.pointer_path) as f:
+                    pointer = json.load(f)
+                artifact = joblib.load(os.path.join(self.model_dir, pointer['path']))
+                if artifact.get('feature_version') == FEATURE_VERSION:
+                    self._artifact = artifact
+                self._pointer_mtime = mtime
+            return self._artifact
+
+    def artifact_age(self, now=None):
+        """Seconds since the current artifact was trained, or None without one"""
+        artifact = self.model()
+        if artifact is None:
+            return None
+        return ((now or datetime.now()) - datetime.fromisoformat(artifact['trained_at'])).total_seconds()
+
+    def predict_all(self, conn):
+        """Forecast rows for every zone and horizon from the latest complete features"""
+        artifact = self.model()
+        if artifact is None:
+            return []
+
+        wide = load_hourly(conn, max(LAGS) + 48)
+        if wide.empty:
+            return []
+        features = build_features(wide).dropna(subset=FEATURES)
+        latest = features.groupby(level='zone').tail(1)
+        latest = latest[latest.index.get_level_values('zone').isin(list(artifact['models']))]
+        if latest.empty:
+            return []
+
+        generated_at = datetime.now().isoformat()
+        rows = []
+        for (time, zone), values in zip(latest.index, latest[FEATURES].to_numpy()):
+            predictions = artifact['models'][zone].predict(values.reshape(1, -1))[0]
+            for horizon, load in zip(artifact['horizons'], predictions):
+                target_time = (time + timedelta(hours=horizon)).isoformat()
+                confidence = artifact['confidence'][zone][horizon]
+                rows.append((zone, horizon, target_time, float(load), confidence,
+                             artifact['version'], generated_at))
+        return rows
+
+
+if __name__ == '__main__':
+    from db import ConnectionManager
+
+    if sys.argv[1:] != ['train']:
+        sys.exit('usage: python forecast.py train')
+
+    version = LoadForecaster(ConnectionManager()).train()
+    if version is None:
+        sys.exit(f'Not enough hourly history to train (need {MIN_TRAINING_ROWS} complete hours per zone)')
+    print(f"🤖 Trained load forecast models, version {version}")
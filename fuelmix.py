@@ -0,0 +1,82 @@
+"""Per-interval fuel mix metrics.
+
+Each interval's generation is pivoted to one row with a column per fuel,
+from which shares, renewable share and an estimated carbon intensity come
+out as whole-column operations. Intensities are typical direct emissions
+per MWh generated for each NYISO fuel category, good for trends rather
+than reporting.
+"""
+import time
+
+import pandas as pd
+
+# Fuel -> (renewable, estimated kg CO2 per MWh)
+FUEL_PROFILES = {
+    'Nuclear': (False, 0.0),
+    'Hydro': (True, 0.0),
+    'Wind': (True, 0.0),
+    'Solar': (True, 0.0),
+    # Biomass, landfill gas and refuse, counted as carbon neutral
+    'Other Renewables': (True, 0.0),
+    'Natural Gas': (False, 410.0),
+    'Dual Fuel': (False, 450.0),
+    'Other Fossil Fuels': (False, 780.0),
+}
+# Fuels not listed above are treated as unspecified fossil generation
+DEFAULT_PROFILE = (False, 450.0)
+
+SUMMARY_COLUMNS = ['ts', 'total_mw', 'renewable_mw', 'renewable_share', 'carbon_intensity']
+
+
+def pivot_intervals(frame):
+    """ts x fuel generation from long (ts, fuel_type, generation_mw) rows"""
+    return frame.pivot_table(index='ts', columns='fuel_type', values='generation_mw', aggfunc='last')
+
+
+def shares(wide):
+    """Each fuel's percentage of its interval's total, 0 where the total is not positive"""
+    total = wide.sum(axis=1)
+    return wide.div(total.where(total > 0), axis=0).mul(100).fillna(0.0)
+
+
+def interval_metrics(wide):
+    """One summary row per interval of a pivot_intervals frame"""
+    profiles = [FUEL_PROFILES.get(fuel, DEFAULT_PROFILE) for fuel in wide.columns]
+    renewable = [renewable for renewable, _ in profiles]
+    intensity = pd.Series([kg for _, kg in profiles], index=wide.columns)
+
+    generation = wide.fillna(0.0)
+    total = generation.sum(axis=1)
+    renewable_mw = generation.loc[:, renewable].sum(axis=1)
+    positive = total.where(total > 0)
+    return pd.DataFrame({
+        'ts': wide.index.to_numpy(),
+        'total_mw': total.to_numpy(),
+        'renewable_mw': renewable_mw.to_numpy(),
+        'renewable_share': (renewable_mw / positive * 100).to_numpy(),
+        'carbon_intensity': (generation.mul(intensity, axis=1).sum(axis=1) / positive).to_numpy(),
+    }, columns=SUMMARY_COLUMNS)
+
+
+UPSERT_SQL = '''
+    INSERT INTO fuel_mix_intervals (ts, total_mw, renewable_mw, renewable_share, carbon_intensity, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (ts) DO UPDATE SET
+        total_mw = excluded.total_mw,
+        renewable_mw = excluded.renewable_mw,
+        renewable_share = excluded.renewable_share,
+        carbon_intensity = excluded.carbon_intensity
+'''
+
+
+def write_interval_metrics(conn, wide, created_at):
+    metrics = interval_metrics(wide).astype({'ts': 'int64'})
+    metrics = metrics.astype(object).where(metrics.notna(), None)
+    conn.executemany(UPSERT_SQL, [row + (created_at,) for row in metrics.itertuples(index=False, name=None)])
+
+
+def seed_interval_metrics(conn):
+    """Summarize the fuel mix rows already stored"""
+    frame = pd.read_sql_query('SELECT ts, fuel_type, generation_mw FROM fuel_mix_rows', conn)
+    if not frame.empty:
+        write_interval_metrics(conn, pivot_intervals(frame), int(time.time()))
@@ -0,0 +1,240 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Each process keeps its own registry; with several gunicorn workers a scrape
+sees the worker that answered it. Collector metrics are also persisted in
+collector_metrics so every worker can report them.
+"""
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value not in (float('inf'), float('-inf')) else ('+Inf' if value > 0 else '-Inf')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{format_labels(dict(zip(self.labelnames, key)))} {_number(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(key, (list(counts), count, total)) for key, (counts, count, total) in self._values.items()]
+        for key, (counts, count, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f'{self.name}_bucket{format_labels({**labels, "le": _number(bound)})} {cumulative}')
+            lines.append(f'{self.name}_bucket{format_labels({**labels, "le": "+Inf"})} {count}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {_number(total)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return lines
+
+
+REGISTRY = Registry()
+
+sql_duration = REGISTRY.histogram(
+    'nyiso_sql_duration_seconds', 'Time to execute each SQL statement', ['statement'], SQL_BUCKETS)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """SQL collapsed to one line, with placeholder lists of any length folded together"""
+    sql = ' '.join(sql.split())
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?, ...', sql)[:200]
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            sql_duration.observe(time.perf_counter() - started, statement=statement_label(sql))
+
+    def executemany(self, sql, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            sql_duration.observe(time.perf_counter() - started, statement=statement_label(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are recorded in nyiso_sql_duration_seconds"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+class PersistedMetrics:
+    """Counters and gauges accumulated in memory and folded into collector_metrics.
+
+    definitions maps metric name -> (type, help). Counters are added to the
+    stored value on flush, gauges replace it.
+    """
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, format_labels(labels))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._pending[(name, format_labels(labels))] = value
+
+    def flush(self, conn):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        counters = [(name, labels, value) for (name, labels), value in pending.items()
+                    if self.definitions[name][0] == 'counter']
+        gauges = [(name, labels, value) for (name, labels), value in pending.items()
+                  if self.definitions[name][0] == 'gauge']
+        conn.executemany('''
+            INSERT INTO collector_metrics (name, labels, value) VALUES (?, ?, ?)
+            ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value
+        ''', counters)
+        conn.executemany('INSERT OR REPLACE INTO collector_metrics (name, labels, value) VALUES (?, ?, ?)', gauges)
+
+    def render(self, conn):
+        stored = {}
+        for name, labels, value in conn.execute('SELECT name, labels, value FROM collector_metrics ORDER BY name'):
+            stored.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help) in self.definitions.items():
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{labels} {_number(value)}' for labels, value in stored.get(name, [])]
+        return lines
+
+    def value(self, conn, name, **labels):
+        row = conn.execute('SELECT value FROM collector_metrics WHERE name = ? AND labels = ?',
+                           (name, format_labels(labels))).fetchone()
+        return row[0] if row else None
+
+
+# Metric name -> (type, help), persisted in collector_metrics
+COLLECTOR_METRICS = {
+    'nyiso_collector_cycles_total': ('counter', 'Collection cycles by result'),
+    'nyiso_collector_cycle_seconds_total': ('counter', 'Time spent in collection cycles'),
+    'nyiso_collector_last_cycle_seconds': ('gauge', 'Duration of the last collection cycle'),
+    'nyiso_collector_last_cycle_timestamp_seconds': ('gauge', 'Unix time the last cycle finished'),
+    'nyiso_collector_last_success_timestamp_seconds': ('gauge', 'Unix time of the last cycle without errors'),
+    'nyiso_collector_fetches_total': ('counter', 'Feed fetches by HTTP status'),
+    'nyiso_collector_fetch_bytes_total': ('counter', 'Bytes received from the MIS feeds'),
+    'nyiso_collector_rows_ingested_total': ('counter', 'Rows inserted or revised'),
+    'nyiso_collector_rows_skipped_total': ('counter', 'Duplicate rows skipped'),
+    'nyiso_collector_errors_total': ('counter', 'Collection errors by stage'),
+}
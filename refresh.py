@@ -0,0 +1,105 @@
+"""Manual refreshes as coalesced jobs, run by the collecting process.
+
+A refresh request either joins the job already queued or running (in any
+worker, since jobs live in refresh_jobs) or queues a new one, and returns
+at once. Web workers only ever insert and read jobs; whichever process
+holds the collector lease picks queued jobs up between scheduled cycles
+and runs them as an early collection cycle. Requests within min_interval
+of the last cycle that finished without errors are refused, so the button
+cannot hammer the MIS feeds.
+"""
+import os
+import time
+import uuid
+
+JOB_COLUMNS = ['id', 'status', 'requested_at', 'started_at', 'finished_at', 'requests', 'error']
+ACTIVE = ('queued', 'running')
+# A job still active after this long was never picked up, or its collector died
+ABANDON_SECONDS = 300
+# Finished jobs are kept this long for status polling
+KEEP_SECONDS = 86400
+
+
+class RefreshThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'data was refreshed recently; retry in {retry_after:.0f} seconds')
+        self.retry_after = retry_after
+
+
+class RefreshJobs:
+    """Submits, claims and reports manual refresh jobs.
+
+    last_success returns the Unix time of the last error-free cycle, read
+    through the connection it is given; only submit needs it.
+    """
+
+    def __init__(self, db, last_success=None, min_interval=None):
+        self.db = db
+        self.last_success = last_success
+        self.min_interval = min_interval or int(os.environ.get('NYISO_REFRESH_MIN_SECONDS', 60))
+
+    def submit(self):
+        """The job this request joins, or a newly queued one; raises RefreshThrottled"""
+        now = time.time()
+        with self.db.writer() as conn:
+            # IMMEDIATE so two workers cannot both find no job and queue one
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(f"""
+                UPDATE refresh_jobs SET status = 'failed', finished_at = ?, error = 'abandoned'
+                WHERE status IN ({', '.join('?' * len(ACTIVE))}) AND requested_at < ?
+            """, (now, *ACTIVE, now - ABANDON_SECONDS))
+            active = conn.execute(f"""
+                SELECT id FROM refresh_jobs WHERE status IN ({', '.join('?' * len(ACTIVE))})
+                ORDER BY requested_at LIMIT 1
+            """, ACTIVE).fetchone()
+            if active is not None:
+                conn.execute('UPDATE refresh_jobs SET requests = requests + 1 WHERE id = ?', active)
+                return self._get(conn, active[0])
+
+            last = self.last_success(conn)
+            if last is not None and now - last < self.min_interval:
+                raise RefreshThrottled(self.min_interval - (now - last))
+
+            job_id = uuid.uuid4().hex[:16]
+            conn.execute('DELETE FROM refresh_jobs WHERE finished_at < ?', (now - KEEP_SECONDS,))
+            conn.execute("INSERT INTO refresh_jobs (id, status, requested_at) VALUES (?, 'queued', ?)",
+                         (job_id, now))
+            return self._get(conn, job_id)
+
+    def queued(self):
+        with self.db.reader() as conn:
+            return conn.execute("SELECT 1 FROM refresh_jobs WHERE status = 'queued' LIMIT 1").fetchone() is not None
+
+    def wait(self, timeout, poll=1):
+        """Sleep up to timeout seconds, returning early once a job is queued"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.queued():
+                return True
+            time.sleep(min(poll, max(deadline - time.monotonic(), 0)))
+        return False
+
+    def claim(self):
+        """Mark every queued job running; their ids, for finish after the cycle"""
+        with self.db.writer() as conn:
+            ids = [job_id for job_id, in conn.execute("SELECT id FROM refresh_jobs WHERE status = 'queued'")]
+            conn.executemany("UPDATE refresh_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                             [(time.time(), job_id) for job_id in ids])
+        return ids
+
+    def finish(self, ids, ok, error=None):
+        if not ids:
+            return
+        with self.db.writer() as conn:
+            conn.executemany('UPDATE refresh_jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?', [
+                ('succeeded' if ok else 'failed', time.time(),
+                 None if ok else error or 'the cycle finished with errors', job_id)
+                for job_id in ids])
+
+    def _get(self, conn, job_id):
+        row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM refresh_jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else dict(zip(JOB_COLUMNS, row))
+
+    def get(self, job_id):
+        with self.db.reader() as conn:
+            return self._get(conn, job_id)
@@ -0,0 +1,223 @@
+"""Per-zone 5-minute, hourly and daily aggregates of realtime_data.
+
+pandas is imported by the functions that fold rows in, so a web worker
+that only reads rollups never loads it.
+"""
+from datetime import datetime
+
+# Rollup name -> (pandas bucket frequency, bucket width in seconds), finest first
+ROLLUPS = {
+    '5min': ('5min', 300),
+    'hourly': ('H', 3600),
+    'daily': ('D', 86400),
+}
+
+# Rollup metric -> realtime_data column
+METRICS = {
+    'lbmp': 'lbmp',
+    'load': 'load_mw',
+    'congestion': 'congestion',
+}
+
+RESOLUTIONS = {'5min': 300, 'hour': 3600, 'day': 86400}
+
+# Upper bound on points per zone when the caller asks for resolution=auto
+HISTORY_MAX_POINTS = 500
+
+BUCKET_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# History rows are keyed on the NYISO wall-clock time as seconds since
+# 1970-01-01, floored to the 5-minute dispatch interval
+INTERVAL_SECONDS = 300
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_timestamps(values):
+    """Parse NYISO 'MM/DD/YYYY HH:MM:SS' stamps, falling back to ISO strings"""
+    import pandas as pd
+
+    values = pd.Series(values)
+    parsed = pd.to_datetime(values, format='%m/%d/%Y %H:%M:%S', errors='coerce')
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(values[missing], errors='coerce')
+    return parsed
+
+
+def epoch_seconds(values, interval=INTERVAL_SECONDS):
+    """Interval-floored epoch seconds of stamps or datetimes, NaN where unparseable"""
+    import pandas as pd
+
+    values = pd.Series(values)
+    parsed = values if pd.api.types.is_datetime64_any_dtype(values) else parse_timestamps(values)
+    return (parsed.dt.floor(f'{interval}s') - pd.Timestamp(EPOCH)).dt.total_seconds()
+
+
+def epoch_of(moment):
+    return int((moment - EPOCH).total_seconds())
+
+
+def create_rollup_tables(cursor):
+    metric_columns = ',\n'.join(
+        f'{metric}_sum REAL, {metric}_min REAL, {metric}_max REAL, {metric}_last REAL'
+        for metric in METRICS)
+    for name in ROLLUPS:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS realtime_rollup_{name} (
+                zone TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                last_ts TEXT,
+                {metric_columns},
+                PRIMARY KEY (zone, bucket)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_rollup_{name}_bucket ON realtime_rollup_{name} (bucket)')
+
+
+def _upsert_sql(name):
+    columns = ['zone', 'bucket', 'samples', 'last_ts']
+    updates = ['samples = samples + excluded.samples']
+    for metric in METRICS:
+        columns += [f'{metric}_sum', f'{metric}_min', f'{metric}_max', f'{metric}_last']
+        updates += [
+            f'{metric}_sum = {metric}_sum + excluded.{metric}_sum',
+            f'{metric}_min = MIN({metric}_min, excluded.{metric}_min)',
+            f'{metric}_max = MAX({metric}_max, excluded.{metric}_max)',
+            f'{metric}_last = CASE WHEN excluded.last_ts >= last_ts '
+            f'THEN excluded.{metric}_last ELSE {metric}_last END',
+        ]
+    # SET expressions all see the pre-update row, so last_ts is compared first
+    updates.append('last_ts = MAX(last_ts, excluded.last_ts)')
+    return f'''
+        INSERT INTO realtime_rollup_{name} ({', '.join(columns)})
+        VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT (zone, bucket) DO UPDATE SET
+            {', '.join(updates)}
+    '''
+
+
+UPSERT_SQL = {name: _upsert_sql(name) for name in ROLLUPS}
+
+
+def rollup_rows(batch, freq):
+    """Aggregate a batch into one partial row per (zone, bucket)"""
+    batch = batch.assign(bucket=batch['ts'].dt.floor(freq)).sort_values('ts', kind='stable')
+    aggregations = {'samples': ('samples', 'sum'), 'last_ts': ('ts', 'max')}
+    for metric in METRICS:
+        aggregations.update({
+            f'{metric}_sum': (f'{metric}_delta', 'sum'),
+            f'{metric}_min': (metric, 'min'),
+            f'{metric}_max': (metric, 'max'),
+            f'{metric}_last': (metric, 'last'),
+        })
+    partials = batch.groupby(['zone', 'bucket'], sort=False).agg(**aggregations).reset_index()
+    partials['bucket'] = partials['bucket'].dt.strftime(BUCKET_FORMAT)
+    partials['last_ts'] = partials['last_ts'].dt.strftime(BUCKET_FORMAT)
+    return list(partials.itertuples(index=False, name=None))
+
+
+def apply_rollups(conn, frame, archived_days=None):
+    """Fold newly written realtime rows into every rollup table.
+
+    frame carries the written values plus, for revisions of existing rows,
+    the previous values in old_<column>. New rows add a sample; revisions
+    only move the sums by the difference. Min/max cannot be narrowed
+    incrementally, so a revision can leave them wider than a full rebuild.
+
+    archived_days are the YYYY-MM-DD days archived from realtime_data, read
+    from archive_partitions when not given.
+    """
+    import pandas as pd
+
+    if 'ts' in frame:
+        ts = pd.to_datetime(frame['ts'].to_numpy(), unit='s')
+    else:
+        ts = parse_timestamps(frame['timestamp']).to_numpy()
+    batch = pd.DataFrame({'zone': frame['zone'].to_numpy(), 'ts': ts})
+    is_new = frame['old_lbmp'].isna().to_numpy() if 'old_lbmp' in frame else True
+    batch['samples'] = is_new * 1
+    for metric, column in METRICS.items():
+        values = frame[column].to_numpy()
+        batch[metric] = values
+        previous = frame[f'old_{column}'].fillna(0).to_numpy() if f'old_{column}' in frame else 0
+        batch[f'{metric}_delta'] = values - previous
+    batch = batch[batch['ts'].notna()]
+    if batch.empty:
+        return
+
+    # Archived days have no 5-minute buckets; Archive.history rebuilds them
+    # from the partition and any revision written since
+    if archived_days is None:
+        archived_days = {day for day, in conn.execute(
+            "SELECT day FROM archive_partitions WHERE table_name = 'realtime_data'")}
+    on_archived_day = batch['ts'].dt.strftime('%Y-%m-%d').isin(archived_days) if archived_days else None
+
+    for name, (freq, _) in ROLLUPS.items():
+        rows = batch[~on_archived_day] if name == '5min' and on_archived_day is not None else batch
+        if not rows.empty:
+            conn.executemany(UPSERT_SQL[name], rollup_rows(rows, freq))
+
+
+def seed_rollups(conn, chunksize=100000):
+    """Build the rollups from the rows already in realtime_data"""
+    import pandas as pd
+
+    query = 'SELECT timestamp, zone, load_mw, lbmp, congestion FROM realtime_data'
+    for chunk in pd.read_sql_query(query, conn, chunksize=chunksize):
+        # Runs before archive_partitions exists, when nothing has been archived
+        apply_rollups(conn, chunk, archived_days=())
+
+
+def choose_rollup(start, end, resolution='auto'):
+    """The coarsest rollup whose buckets are no wider than the resolution asked for.
+
+    With resolution=auto this is the finest rollup that still keeps a zone's
+    series within HISTORY_MAX_POINTS.
+    """
+    if end <= start:
+        raise ValueError('end must be after start')
+    if resolution == 'auto':
+        min_width = (end - start).total_seconds() / HISTORY_MAX_POINTS
+        for name, (_, width) in ROLLUPS.items():
+            if width >= min_width:
+                return name
+        return list(ROLLUPS)[-1]
+
+    if resolution in RESOLUTIONS:
+        max_width = RESOLUTIONS[resolution]
+    elif str(resolution).isdigit():
+        max_width = int(resolution)
+    else:
+        raise ValueError(f"resolution must be auto, {', '.join(RESOLUTIONS)} or a number of seconds")
+
+    chosen = '5min'
+    for name, (_, width) in ROLLUPS.items():
+        if width <= max_width:
+            chosen = name
+    return chosen
+
+
+def query_history(conn, rollup, zones, start, end):
+    """Per-zone points of one rollup in [start, end), keyed by zone"""
+    params = [start.strftime(BUCKET_FORMAT), end.strftime(BUCKET_FORMAT)]
+    zone_filter = ''
+    if zones:
+        zone_filter = f"AND zone IN ({', '.join('?' * len(zones))})"
+        params += zones
+
+    metric_columns = ', '.join(
+        f'{metric}_sum / samples, {metric}_min, {metric}_max, {metric}_last' for metric in METRICS)
+    rows = conn.execute(f'''
+        SELECT zone, bucket, samples, {metric_columns}
+        FROM realtime_rollup_{rollup}
+        WHERE bucket >= ? AND bucket < ? {zone_filter}
+        ORDER BY zone, bucket
+    ''', params)
+
+    keys = ['time', 'samples'] + [f'{metric}_{stat}' for metric in METRICS
+                                  for stat in ('avg', 'min', 'max', 'last')]
+    series = {}
+    for zone, *values in rows:
+        series.setdefault(zone, []).append(dict(zip(keys, values)))
+    return series
@@ -0,0 +1,366 @@
+"""Tables of nyiso.db and the ordered migrations that bring a database up to date.
+
+migrate() is cheap once PRAGMA user_version shows every migration has run,
+and only the migrations that rebuild data import pandas.
+"""
+from rollups import INTERVAL_SECONDS
+
+
+def create_tables(cursor):
+    # The original layout; later migrations index and compact it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS realtime_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            zone TEXT,
+            load_mw REAL,
+            lbmp REAL,
+            congestion REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fuel_mix_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            fuel_type TEXT,
+            generation_mw REAL,
+            percentage REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            alert_type TEXT,
+            zone TEXT,
+            message TEXT,
+            value REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migrate_realtime_upsert_key(cursor):
+    # Collapse duplicates left behind by earlier re-inserting polls so the
+    # (timestamp, zone) upsert key can be enforced
+    cursor.execute('''
+        DELETE FROM realtime_data WHERE id NOT IN (
+            SELECT MAX(id) FROM realtime_data GROUP BY timestamp, zone
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_realtime_ts_zone
+        ON realtime_data (timestamp, zone)
+    ''')
+
+
+def _migrate_created_at_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_realtime_created_at ON realtime_data (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fuel_mix_created_at ON fuel_mix_data (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts_log (created_at)')
+
+
+def _migrate_latest_snapshots(cursor):
+    # One row per zone / fuel, kept current by the collector so the "current"
+    # endpoints never have to search the history tables
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS realtime_latest (
+            zone TEXT PRIMARY KEY,
+            timestamp TEXT,
+            load_mw REAL,
+            lbmp REAL,
+            congestion REAL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fuel_mix_latest (
+            fuel_type TEXT PRIMARY KEY,
+            timestamp TEXT,
+            generation_mw REAL,
+            percentage REAL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Seed from the most recent batch of an existing database
+    cursor.execute('''
+        INSERT OR REPLACE INTO realtime_latest
+        (zone, timestamp, load_mw, lbmp, congestion, updated_at)
+        SELECT zone, timestamp, load_mw, lbmp, congestion, created_at
+        FROM realtime_data
+        WHERE created_at = (SELECT MAX(created_at) FROM realtime_data)
+        ORDER BY id
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO fuel_mix_latest
+        (fuel_type, timestamp, generation_mw, percentage, updated_at)
+        SELECT fuel_type, timestamp, generation_mw, percentage, created_at
+        FROM fuel_mix_data
+        WHERE created_at = (SELECT MAX(created_at) FROM fuel_mix_data)
+        ORDER BY id
+    ''')
+
+
+def _migrate_dataset_versions(cursor):
+    # Change counters shared between the collecting process and web workers
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dataset_versions (
+            dataset TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _migrate_fuel_mix_upsert_key(cursor):
+    cursor.execute('''
+        DELETE FROM fuel_mix_data WHERE id NOT IN (
+            SELECT MAX(id) FROM fuel_mix_data GROUP BY timestamp, fuel_type
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_fuel_mix_ts_fuel
+        ON fuel_mix_data (timestamp, fuel_type)
+    ''')
+
+
+def _migrate_backfill_progress(cursor):
+    # Days already loaded by backfill.py, so an interrupted run can resume
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            feed TEXT,
+            day TEXT,
+            rows INTEGER,
+            completed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (feed, day)
+        )
+    ''')
+
+
+def _migrate_realtime_rollups(cursor):
+    from rollups import create_rollup_tables, seed_rollups
+
+    create_rollup_tables(cursor)
+    seed_rollups(cursor.connection)
+
+
+def _migrate_load_forecasts(cursor):
+    # Latest batch prediction per zone and horizon, replaced after each cycle
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS load_forecasts (
+            zone TEXT,
+            horizon_hours INTEGER,
+            target_time TEXT,
+            load_mw REAL,
+            confidence REAL,
+            model_version TEXT,
+            generated_at TEXT,
+            PRIMARY KEY (zone, horizon_hours)
+        )
+    ''')
+
+
+def _migrate_archive_partitions(cursor):
+    # Per-day files written by archive.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            table_name TEXT,
+            day TEXT,
+            rows INTEGER,
+            path TEXT,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, day)
+        )
+    ''')
+
+
+def _migrate_alerts_dedup_key(cursor):
+    cursor.execute('''
+        DELETE FROM alerts_log WHERE id NOT IN (
+            SELECT MAX(id) FROM alerts_log GROUP BY timestamp, alert_type, zone
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_ts_type_zone
+        ON alerts_log (timestamp, alert_type, zone)
+    ''')
+
+
+def _migrate_collector_metrics(cursor):
+    # Collector counters and gauges, readable by every web worker's /metrics
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS collector_metrics (
+            name TEXT,
+            labels TEXT,
+            value REAL,
+            PRIMARY KEY (name, labels)
+        )
+    ''')
+
+
+# Dictionary table -> id column
+DICTIONARIES = {'zones': 'zone_id', 'fuels': 'fuel_id'}
+
+# History table -> (dictionary table, text column it replaces, value columns)
+COMPACT_TABLES = {
+    'realtime_data': ('zones', 'zone', ['load_mw', 'lbmp', 'congestion']),
+    'fuel_mix_data': ('fuels', 'fuel_type', ['generation_mw', 'percentage']),
+}
+
+# Read the compact tables back in their original column layout
+ROW_VIEWS = {'realtime_data': 'realtime_rows', 'fuel_mix_data': 'fuel_mix_rows'}
+
+
+def _epoch_sql(column):
+    # NYISO 'MM/DD/YYYY HH:MM:SS' stamps are reordered for strftime; anything
+    # else (the ISO stamps of sample data) is parsed as it is
+    parsed = f'''CASE WHEN {column} LIKE '__/__/____ %'
+        THEN strftime('%s', substr({column}, 7, 4) || '-' || substr({column}, 1, 2) || '-'
+                            || substr({column}, 4, 2) || substr({column}, 11))
+        ELSE strftime('%s', {column}) END'''
+    return f'(CAST({parsed} AS INTEGER) / {INTERVAL_SECONDS} * {INTERVAL_SECONDS})'
+
+
+def dictionary_ids(conn, table, names):
+    """name -> id in a dictionary table, adding the names it does not have yet"""
+    names = list(names)
+    if not names:
+        return {}
+    id_column = DICTIONARIES[table]
+    conn.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in names])
+    return dict(conn.execute(f"SELECT name, {id_column} FROM {table} WHERE name IN ({', '.join('?' * len(names))})",
+                             names))
+
+
+def _migrate_compact_history(cursor):
+    # INTEGER epoch keys and dictionary ids instead of repeated strings, with
+    # rows clustered by (zone_id, ts) and a ts index for cross-zone ranges
+    for table, id_column in DICTIONARIES.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {id_column} INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+
+    for table, (dictionary, name_column, values) in COMPACT_TABLES.items():
+        id_column = DICTIONARIES[dictionary]
+        epoch = _epoch_sql('h.timestamp')
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {dictionary} (name)
+            SELECT DISTINCT {name_column} FROM {table} WHERE {name_column} IS NOT NULL ORDER BY {name_column}
+        ''')
+        cursor.execute(f'''
+            CREATE TABLE {table}_compact (
+                {id_column} INTEGER NOT NULL REFERENCES {dictionary} ({id_column}),
+                ts INTEGER NOT NULL,
+                {', '.join(f'{column} REAL' for column in values)},
+                created_at INTEGER,
+                PRIMARY KEY ({id_column}, ts)
+            ) WITHOUT ROWID
+        ''')
+        # Ordered by id so the newest row wins where stamps collapse onto one interval
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO {table}_compact
+            SELECT d.{id_column}, {epoch}, {', '.join(f'h.{column}' for column in values)},
+                   CAST(strftime('%s', h.created_at) AS INTEGER)
+            FROM {table} h JOIN {dictionary} d ON d.name = h.{name_column}
+            WHERE {epoch} IS NOT NULL
+            ORDER BY h.id
+        ''')
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute(f'ALTER TABLE {table}_compact RENAME TO {table}')
+        cursor.execute(f'CREATE INDEX idx_{table}_ts ON {table} (ts)')
+        cursor.execute(f'''
+            CREATE VIEW {ROW_VIEWS[table]} AS
+            SELECT strftime('%m/%d/%Y %H:%M:%S', h.ts, 'unixepoch') AS timestamp,
+                   d.name AS {name_column},
+                   {', '.join(f'h.{column}' for column in values)},
+                   datetime(h.created_at, 'unixepoch') AS created_at,
+                   h.ts AS ts
+            FROM {table} h JOIN {dictionary} d ON d.{id_column} = h.{id_column}
+        ''')
+
+
+def _migrate_refresh_jobs(cursor):
+    # Manual refreshes, visible to every worker so any of them can report status
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS refresh_jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            requested_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            requests INTEGER NOT NULL DEFAULT 1,
+            error TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_refresh_jobs_status ON refresh_jobs (status)')
+
+
+def _migrate_zone_analytics(cursor):
+    # Cross-zone statistics per window, rewritten by the collector after each batch
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS zone_analytics (
+            window_name TEXT PRIMARY KEY,
+            through_ts INTEGER,
+            payload TEXT NOT NULL
+        )
+    ''')
+
+
+def _migrate_fuel_mix_intervals(cursor):
+    # Totals, renewable share and carbon intensity per interval, kept by the collector
+    from fuelmix import seed_interval_metrics
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fuel_mix_intervals (
+            ts INTEGER PRIMARY KEY,
+            total_mw REAL,
+            renewable_mw REAL,
+            renewable_share REAL,
+            carbon_intensity REAL,
+            created_at INTEGER
+        )
+    ''')
+    seed_interval_metrics(cursor.connection)
+
+
+# Applied in order; PRAGMA user_version records how many have run
+SCHEMA_MIGRATIONS = [
+    _migrate_realtime_upsert_key,
+    _migrate_created_at_indexes,
+    _migrate_latest_snapshots,
+    _migrate_dataset_versions,
+    _migrate_fuel_mix_upsert_key,
+    _migrate_backfill_progress,
+    _migrate_realtime_rollups,
+    _migrate_load_forecasts,
+    _migrate_archive_partitions,
+    _migrate_alerts_dedup_key,
+    _migrate_collector_metrics,
+    _migrate_compact_history,
+    _migrate_refresh_jobs,
+    _migrate_zone_analytics,
+    _migrate_fuel_mix_intervals,
+]
+
+
+def migrate(db):
+    """Create the base tables and apply pending migrations, tracked with PRAGMA user_version"""
+    with db.writer() as conn:
+        cursor = conn.cursor()
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= len(SCHEMA_MIGRATIONS):
+            return
+
+        create_tables(cursor)
+        for target, migration in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+            with conn:
+                cursor.execute('BEGIN')
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {target}')
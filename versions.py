@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+class DatasetVersions:
+    """Change counters for each dataset, shared through the dataset_versions table.
+
+    The collecting process bumps a dataset after every commit that changes
+    what the API would return; every other process picks the change up by
+    polling. data_version is this process's own counter, moved by either.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        # Bumped after every commit that changes what the API would return
+        self.data_version = 0
+        self._lock = threading.Lock()
+        # Last dataset_versions row seen per dataset
+        with self.db.reader() as conn:
+            self._seen = dict(conn.execute('SELECT dataset, version FROM dataset_versions'))
+        # Datasets changed since listeners were last notified
+        self._changed = set()
+        # Called with the set of changed datasets after each collection cycle
+        self.listeners = []
+
+    def pending(self):
+        """Datasets changed since listeners were last notified"""
+        with self._lock:
+            return set(self._changed)
+
+    def bump(self, *datasets):
+        with self._lock:
+            with self.db.writer() as conn:
+                conn.executemany('''
+                    INSERT INTO dataset_versions (dataset, version) VALUES (?, 1)
+                    ON CONFLICT (dataset) DO UPDATE SET version = version + 1
+                ''', [(dataset,) for dataset in datasets])
+                placeholders = ', '.join('?' * len(datasets))
+                versions = conn.execute(
+                    f'SELECT dataset, version FROM dataset_versions WHERE dataset IN ({placeholders})',
+                    datasets).fetchall()
+
+            self._seen.update(versions)
+            self.data_version += 1
+            self._changed.update(datasets)
+
+    def sync(self):
+        """Pick up commits made by a collector running in another process"""
+        with self._lock:
+            with self.db.reader() as conn:
+                versions = dict(conn.execute('SELECT dataset, version FROM dataset_versions'))
+
+            changed = {dataset for dataset, version in versions.items()
+                       if self._seen.get(dataset) != version}
+            if not changed:
+                return
+            self._seen.update(versions)
+            self.data_version += 1
+            self._changed.update(changed)
+
+        self.notify_listeners()
+
+    def notify_listeners(self):
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        if not changed:
+            return
+
+        for listener in self.listeners:
+            try:
+                listener(changed)
+            except Exception as e:
+                print(f"Listener error: {e}")
+
+
+def watch_versions(versions, interval=2):
+    while True:
+        try:
+            versions.sync()
+        except Exception as e:
+            print(f"Version watch error: {e}")
+        time.sleep(interval)